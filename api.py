@@ -0,0 +1,21 @@
+import argparse
+import asyncio
+from scheduler.aiostorage import open_async_storage
+from scheduler.api import serve
+from scheduler.config import load_config
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve month counts, day listings, range queries and inserts as JSON over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--batch-size", type=int, default=500, help="inserts written per transaction at most")
+    parser.add_argument("--linger", type=float, default=0.01, help="seconds to hold an insert for others to join it")
+    args = parser.parse_args()
+
+    storage = open_async_storage(load_config())
+    print(f"Serving on http://{args.host}:{args.port}", flush=True)
+    try:
+        asyncio.run(serve(storage, args.host, args.port, args.batch_size, args.linger))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtWidgets import QApplication
+import main
+from scheduler.model import Day
+from scheduler.times import DAY, event_from_timestamps, to_timestamp
+
+YEAR = 2021
+
+
+class TimedDayView(main.DayView):
+    def __init__(self, day):
+        self.loaded = False
+        super().__init__(day)
+
+    def onEventsLoaded(self, events):
+        super().onEventsLoaded(events)
+        self.loaded = True
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def summarize(samples):
+    return {"p50": percentile(samples, 0.5) * 1000,
+            "p99": percentile(samples, 0.99) * 1000,
+            "runs": len(samples)}
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def generate(count, dense, seed=1):
+    rng = random.Random(seed)
+    if dense:
+        start, span = to_timestamp(YEAR, 3, 1), 31 * DAY
+    else:
+        start, span = to_timestamp(YEAR - 2, 1, 1), 5 * 365 * DAY
+    for i in range(count):
+        start_ts = start + rng.randrange(span // 300) * 300
+        yield event_from_timestamps(f"Event {i}", start_ts, start_ts + rng.choice((15, 30, 60, 90)) * 60)
+
+
+def wait_until(app, condition, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("benchmark step did not finish")
+        app.processEvents()
+        time.sleep(0.0005)
+
+
+def timed(app, action, condition, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        action()
+        wait_until(app, condition)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def run_scenario(app, count, dense, runs, batch_size):
+    directory = tempfile.mkdtemp(prefix="scheduler-bench-")
+    env = os.path.join(directory, ".env")
+    with open(env, "w") as f:
+        f.write(f"STORAGE=sqlite\nSQLITE_PATH={os.path.join(directory, 'bench.db')}\nREMOTE_POLL_INTERVAL=0\n")
+    main.initServices(env)
+    results = {}
+
+    batches = []
+    started = time.perf_counter()
+
+    def progress(_):
+        batches.append(time.perf_counter())
+
+    main.storage.add_events(generate(count, dense), batch_size, progress=progress)
+    results["bulk insert"] = summarize([b - a for a, b in zip([started] + batches, batches)])
+    results["bulk insert"]["events/s"] = count / (time.perf_counter() - started)
+
+    window = main.App()
+    window.showMonth(YEAR, 3)
+    model = window.calendarModel
+
+    def render():
+        main.monthCache.clear()
+        window.loadMonth()
+
+    results["month render"] = summarize(timed(app, render, lambda: model.counts is not None and not window.monthLoading, runs))
+
+    position = [2]
+
+    def switch(cached):
+        def action():
+            if not cached:
+                main.monthCache.clear()
+            position[0] = (position[0] + 1) % 12
+            window.showMonth(YEAR, position[0] + 1)
+        return action
+
+    for label, cached in (("month switch", False), ("month switch cached", True)):
+        results[label] = summarize(timed(app, switch(cached), lambda: model.counts is not None and not window.monthLoading, runs))
+
+    busiest = max(main.storage.month_counts(YEAR, 3).items(), key=lambda item: item[1], default=(1, 0))[0]
+    views = []
+
+    def open_day():
+        views.append(TimedDayView(Day(3, YEAR, busiest, "Mon")))
+
+    results["day view open"] = summarize(timed(app, open_day, lambda: views[-1].loaded, runs))
+    for view in views:
+        view.close()
+    window.close()
+    main.writeQueue.wait(timeout=10)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for scenario, metrics in results.items():
+        for name, values in metrics.items():
+            if not isinstance(values, dict) or "p50" not in values:
+                continue
+            previous = baseline.get(scenario, {}).get(name)
+            if previous and values["p50"] > previous["p50"] * (1 + tolerance):
+                regressions.append(f"{scenario} / {name}: p50 {values['p50']:.2f} ms vs baseline {previous['p50']:.2f} ms")
+    return regressions
+
+
+def report(results):
+    for scenario, metrics in results.items():
+        print(scenario)
+        for name, values in metrics.items():
+            if isinstance(values, dict):
+                extra = f"  {values['events/s']:,.0f} events/s" if "events/s" in values else ""
+                print(f"  {name:<22}p50 {values['p50']:9.2f} ms   p99 {values['p99']:9.2f} ms{extra}")
+            else:
+                print(f"  {name:<22}{values:.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time month render, month switch, day view open and bulk insert.")
+    parser.add_argument("--events", type=int, nargs="+", default=[10, 1000, 100000],
+                        help="event volumes to seed, e.g. 10 1000 1000000")
+    parser.add_argument("--layout", choices=("dense", "sparse", "both"), default="both",
+                        help="dense puts every event in one month, sparse spreads them over five years")
+    parser.add_argument("--runs", type=int, default=20, help="repetitions per timed step")
+    parser.add_argument("--batch-size", type=int, default=10000, help="rows per bulk insert transaction")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results saved earlier with --output")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown against the baseline")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv[:1])
+    main.app = app
+    layouts = ("dense", "sparse") if args.layout == "both" else (args.layout,)
+    results = {}
+    for count in args.events:
+        for layout in layouts:
+            scenario = f"{count} events, {layout}"
+            results[scenario] = run_scenario(app, count, layout == "dense", args.runs, args.batch_size)
+            results[scenario]["peak rss mb"] = peak_rss_mb()
+    report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -1,29 +1,742 @@
+import time
+# Taken before the Qt imports so --profile-startup can include them.
+STARTED = time.perf_counter()
+
 from PyQt5.QtWidgets import *
-from PyQt5.QtCore import pyqtSlot, Qt, QPoint, QRect, QSize
-from PyQt5.QtGui import QCursor
+from PyQt5.QtCore import pyqtSignal, pyqtSlot, Qt, QAbstractTableModel, QDate, QModelIndex, QObject, QPoint, QRect, QRunnable, QSize, QThreadPool, QTime, QTimer
+from PyQt5.QtGui import QColor, QCursor, QKeySequence, QPainter, QPalette
 import calendar
 import sys
 import json
 from datetime import datetime
-from pymysql import cursors, connect
-from dotenv import dotenv_values
-import qtawesome as qta
-
-JAN = 1
-FEB = 2
-MAR = 3
-APR = 4
-MAY = 5
-JUN = 6
-JUL = 7
-AUG = 8
-SEP = 9
-OCT = 10
-NOV = 11
-DEC = 12
-
-cal = calendar.Calendar()
-config = dotenv_values(".env")
+from functools import partial
+from scheduler.agenda import columns_pager, storage_pager
+from scheduler.cache import MonthCache
+from scheduler.changes import ChangeFeed, RemoteWatcher, months_of
+from scheduler.columns import EventColumns
+from scheduler.config import load_config
+from scheduler.freetime import SLOT, find_free_time
+from scheduler.intervals import IntervalIndex
+from scheduler.localcache import MirrorWatcher, open_local_cache
+from scheduler.metrics import InstrumentedStorage, Metrics
+from scheduler.model import MONTH_NUMBERS, WEEKDAYS, Day, month_days
+from scheduler.recurrence import RecurrenceRule
+from scheduler.reminders import ReminderDispatcher
+from scheduler.search import SearchIndex
+from scheduler.storage import SQLiteStorage, open_storage
+from scheduler.times import DAY, event_timestamps, format_time, month_range, now_ts, to_timestamp, ts_date, year_range
+from scheduler.writebehind import WriteBehindQueue
+
+config = None
+storage = None
+monthCache = None
+dayCache = None
+writeQueue = None
+changeFeed = None
+remoteWatcher = None
+reminders = None
+searchIndex = None
+calendars = []
+
+
+class StartupProfiler:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.marks   = [("start", STARTED)]
+
+    def mark(self, name):
+        if not self.enabled or any(mark == name for mark, _ in self.marks):
+            return
+        self.marks.append((name, time.perf_counter()))
+        if name == "data ready":
+            self.report()
+
+    def report(self):
+        print("startup profile:", file=sys.stderr)
+        for (_, previous), (name, at) in zip(self.marks, self.marks[1:]):
+            print(f"  {name:<14}{(at - previous) * 1000:8.1f} ms  (at {(at - STARTED) * 1000:.1f} ms)", file=sys.stderr)
+
+
+profiler = StartupProfiler()
+metrics = Metrics()
+
+
+class WorkerSignals(QObject):
+    result = pyqtSignal(object)
+    error  = pyqtSignal(object)
+
+
+class Worker(QRunnable):
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn        = fn
+        self.args      = args
+        self.kwargs    = kwargs
+        self.signals   = WorkerSignals()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    @pyqtSlot()
+    def run(self):
+        if self.cancelled:
+            return
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.error.emit(e)
+            return
+        if not self.cancelled:
+            self.signals.result.emit(result)
+
+    def start(self):
+        QThreadPool.globalInstance().start(self)
+        return self
+
+
+class WriteSignals(QObject):
+    queued  = pyqtSignal(object)
+    flushed = pyqtSignal(object)
+    failed  = pyqtSignal(object, object, bool)
+
+
+writeSignals = WriteSignals()
+
+
+class ChangeSignals(QObject):
+    changed = pyqtSignal(object)
+
+
+changeSignals = ChangeSignals()
+
+
+class SyncSignals(QObject):
+    status = pyqtSignal(bool, int)
+
+
+syncSignals = SyncSignals()
+
+
+class ReminderSignals(QObject):
+    due = pyqtSignal(object)
+
+
+reminderSignals = ReminderSignals()
+
+
+class EventLoopMonitor(QObject):
+    def __init__(self, interval=50, parent=None):
+        super().__init__(parent)
+        self.interval = interval
+        self.worst    = 0.0
+        self.last     = time.perf_counter()
+        self.timer    = QTimer(self)
+        self.timer.timeout.connect(self.onTick)
+        self.timer.start(interval)
+
+    def onTick(self):
+        now = time.perf_counter()
+        stall = max(0.0, (now - self.last) * 1000 - self.interval)
+        self.last = now
+        self.worst = max(self.worst, stall)
+        metrics.record("ui.event loop stall", stall)
+
+    def takeWorst(self):
+        worst, self.worst = self.worst, 0.0
+        return worst
+
+
+class MetricsPanel(QWidget):
+    COLUMNS = ["Metric", "Count", "Rows", "p50 ms", "p99 ms", "Max ms"]
+
+    def __init__(self):
+        QWidget.__init__(self)
+        self.setWindowTitle("Metrics")
+        self.setGeometry(QRect(120, 120, 640, 360))
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget(0, len(self.COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+    def refresh(self):
+        snapshot = metrics.snapshot()
+        self.table.setRowCount(len(snapshot))
+        for row, (name, summary) in enumerate(snapshot.items()):
+            values = [name, str(summary["count"]), str(summary["rows"]),
+                      f"{summary['p50_ms']:.1f}", f"{summary['p99_ms']:.1f}", f"{summary['max_ms']:.1f}"]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+
+
+def initServices(path=".env"):
+    global config, storage, monthCache, dayCache, writeQueue, changeFeed, remoteWatcher, reminders, searchIndex, calendars
+    config = load_config(path)
+    remote = open_storage(config)
+    local = open_local_cache(config)
+    storage = InstrumentedStorage(local or remote, metrics)
+    monthCache = MonthCache(max_bytes=int(config.get("MONTH_CACHE_BYTES") or 1048576))
+    dayCache = MonthCache(max_bytes=int(config.get("DAY_CACHE_BYTES") or 8388608))
+    writeQueue = WriteBehindQueue(storage,
+                                  batch_size=int(config.get("WRITE_BATCH_SIZE") or 100),
+                                  linger=float(config.get("WRITE_LINGER") or 0.2),
+                                  max_attempts=int(config.get("WRITE_MAX_ATTEMPTS") or 5))
+    changeFeed = ChangeFeed()
+    if local is None:
+        remoteWatcher = RemoteWatcher(storage, changeFeed, interval=float(config.get("REMOTE_POLL_INTERVAL") or 15))
+    else:
+        remoteWatcher = MirrorWatcher(InstrumentedStorage(remote, metrics, "remote"), storage, changeFeed,
+                                      interval=float(config.get("REMOTE_POLL_INTERVAL") or 15))
+        remoteWatcher.on_status.append(syncSignals.status.emit)
+    reminders = ReminderDispatcher(storage, lead=int(config.get("REMINDER_LEAD") or 0))
+    searchIndex = SearchIndex()
+    calendars = [storage] + [InstrumentedStorage(SQLiteStorage(path.strip()), metrics, "calendar")
+                             for path in (config.get("FREE_TIME_CALENDARS") or "").split(",") if path.strip()]
+
+    writeQueue.on_queued.append(writeSignals.queued.emit)
+    writeQueue.on_flushed.append(writeSignals.flushed.emit)
+    writeQueue.on_failed.append(writeSignals.failed.emit)
+    writeQueue.on_flushed.append(changeFeed.publish)
+    writeQueue.on_queued.append(searchIndex.add)
+    changeFeed.subscribe(changeSignals.changed.emit)
+    changeFeed.subscribe(reminders.on_change)
+    changeFeed.subscribe(searchIndex.on_change, searchIndex.add)
+    reminders.on_due.append(reminderSignals.due.emit)
+
+
+class MonthModel(QAbstractTableModel):
+    CountRole = Qt.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.year   = None
+        self.month  = None
+        self.weeks  = []
+        self.counts = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.weeks)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 7
+
+    def day(self, index):
+        return self.weeks[index.row()][index.column()]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        day = self.day(index)
+        if role == Qt.DisplayRole:
+            return str(day)
+        if role == Qt.StatusTipRole:
+            return day.toString() if day.dom else None
+        if role == self.CountRole:
+            if not day.dom:
+                return 0
+            if self.counts is None:
+                return None
+            return self.counts.get(day.dom, 0)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return WEEKDAYS[section]
+        return None
+
+    def setMonth(self, year, month):
+        weeks = month_days(year, month)
+        if len(weeks) > len(self.weeks):
+            self.beginInsertRows(QModelIndex(), len(self.weeks), len(weeks) - 1)
+            self.year, self.month, self.weeks, self.counts = year, month, weeks, None
+            self.endInsertRows()
+        elif len(weeks) < len(self.weeks):
+            self.beginRemoveRows(QModelIndex(), len(weeks), len(self.weeks) - 1)
+            self.year, self.month, self.weeks, self.counts = year, month, weeks, None
+            self.endRemoveRows()
+        else:
+            self.year, self.month, self.weeks, self.counts = year, month, weeks, None
+        self.emitAllChanged()
+
+    def setCounts(self, year, month, counts):
+        if (year, month) != (self.year, self.month):
+            return
+        self.counts = counts
+        self.emitAllChanged()
+
+    def setCount(self, year, month, dom, count):
+        if (year, month) != (self.year, self.month) or self.counts is None:
+            return
+        self.counts = dict(self.counts)
+        self.counts[dom] = count
+        offset = calendar.monthrange(year, month)[0]
+        index = self.index((dom + offset - 1) // 7, (dom + offset - 1) % 7)
+        self.dataChanged.emit(index, index)
+
+    def emitAllChanged(self):
+        if self.weeks:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.weeks) - 1, 6))
+
+
+class DayCellDelegate(QStyledItemDelegate):
+    def paint(self, painter, option, index):
+        self.initStyleOption(option, index)
+        option.text = ""
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_ItemViewItem, option, painter, option.widget)
+
+        if option.state & QStyle.State_Selected:
+            painter.setPen(option.palette.color(QPalette.HighlightedText))
+        else:
+            painter.setPen(option.palette.color(QPalette.Text))
+        rect = option.rect.adjusted(6, 4, -6, -4)
+        painter.drawText(rect, Qt.AlignLeft | Qt.AlignTop, index.data(Qt.DisplayRole))
+
+        num_events = index.data(MonthModel.CountRole)
+        if num_events is None:
+            text = "..."
+        elif num_events > 1:
+            text = f"{num_events} events"
+        elif num_events == 1:
+            text = f"{num_events} event"
+        else:
+            return
+        painter.drawText(rect, Qt.AlignLeft | Qt.AlignVCenter, text)
+
+
+# One row per event of a day in start order, filled a page at a time as the view scrolls
+# (canFetchMore/fetchMore), so a day with thousands of events only builds the rows shown.
+class AgendaModel(QAbstractTableModel):
+    loadedAll = pyqtSignal(object)
+    EventRole = Qt.UserRole + 1
+    HEADERS   = ("Time", "Event")
+    OVERLAP   = QColor("#ffe0b2")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pager      = None
+        self.rows       = []
+        self.overlaps   = set()
+        self.active     = None
+        self.fetching   = False
+        self.pageWorker = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        event = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            if index.column() == 0:
+                return f"{format_time(event['start_ts'])} - {format_time(event['end_ts'])}"
+            return event["event_name"]
+        if role == Qt.BackgroundRole and index.row() in self.overlaps:
+            return self.OVERLAP
+        if role == Qt.ToolTipRole and index.row() in self.overlaps:
+            return "Overlaps another event"
+        if role == self.EventRole:
+            return event
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def setPager(self, pager, rows):
+        if self.pageWorker is not None:
+            self.pageWorker.cancel()
+        self.beginResetModel()
+        self.pager, self.rows, self.overlaps, self.active, self.fetching = pager, [], set(), None, False
+        self.markOverlaps(rows)
+        self.rows = list(rows)
+        self.endResetModel()
+        if not pager.has_more():
+            self.loadedAll.emit(pager)
+
+    # Rows arrive in start order, so one sweep keeping the row that reaches furthest is
+    # enough to flag every event that overlaps an earlier one.
+    def markOverlaps(self, rows):
+        for row, event in enumerate(rows, len(self.rows)):
+            end = max(event["end_ts"], event["start_ts"] + 1)
+            if self.active is not None and event["start_ts"] < self.active[1]:
+                self.overlaps.update((row, self.active[0]))
+            if self.active is None or end > self.active[1]:
+                self.active = (row, end)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.pager is not None and not self.fetching and self.pager.has_more()
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        if self.pager.in_memory:
+            self.appendRows(self.pager, self.pager.next_page())
+            return
+        self.fetching = True
+        self.pageWorker = Worker(self.pager.next_page)
+        self.pageWorker.signals.result.connect(partial(self.appendRows, self.pager))
+        self.pageWorker.signals.error.connect(partial(self.onPageFailed, self.pager))
+        self.pageWorker.start()
+
+    def appendRows(self, pager, rows):
+        if pager is not self.pager:
+            return
+        self.fetching = False
+        if rows:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+            self.markOverlaps(rows)
+            self.rows.extend(rows)
+            self.endInsertRows()
+        if not pager.has_more():
+            self.loadedAll.emit(pager)
+
+    def onPageFailed(self, pager, e):
+        if pager is self.pager:
+            self.fetching = False
+        print(e)
+
+
+class YearHeatmap(QWidget):
+    daySelected = pyqtSignal(int, int, int)
+    LABEL_WIDTH = 44
+    EMPTY = QColor("#dddddd")
+    FULL  = QColor("#1b5e20")
+
+    def __init__(self, year, parent=None):
+        super().__init__(parent)
+        self.year   = year
+        self.start  = year_range(year)[0]
+        self.days   = (year_range(year)[1] - self.start) // DAY
+        self.offset = calendar.weekday(year, 1, 1)
+        self.counts = None
+        self.peak   = 0
+        self.setMinimumSize(self.LABEL_WIDTH + 54 * 6, 7 * 6)
+        self.setMouseTracking(True)
+
+    def setCounts(self, counts):
+        self.counts = counts
+        self.update()
+
+    def setPeak(self, peak):
+        self.peak = peak
+        self.update()
+
+    def cellSize(self):
+        return max(4, min((self.width() - self.LABEL_WIDTH) // 54, self.height() // 7))
+
+    def colorFor(self, count):
+        if not count or not self.peak:
+            return self.EMPTY
+        t = 0.15 + 0.85 * min(count / self.peak, 1.0)
+        return QColor(int(self.EMPTY.red() + (self.FULL.red() - self.EMPTY.red()) * t),
+                      int(self.EMPTY.green() + (self.FULL.green() - self.EMPTY.green()) * t),
+                      int(self.EMPTY.blue() + (self.FULL.blue() - self.EMPTY.blue()) * t))
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setPen(self.palette().color(QPalette.Text))
+        painter.drawText(QRect(0, 0, self.LABEL_WIDTH, self.height()), Qt.AlignLeft | Qt.AlignVCenter, str(self.year))
+        size = self.cellSize()
+        for i in range(self.days):
+            column, row = divmod(i + self.offset, 7)
+            color = self.EMPTY if self.counts is None else self.colorFor(self.counts[i])
+            painter.fillRect(self.LABEL_WIDTH + column * size, row * size, size - 1, size - 1, color)
+
+    def dayAt(self, pos):
+        size = self.cellSize()
+        column, row = (pos.x() - self.LABEL_WIDTH) // size, pos.y() // size
+        i = column * 7 + row - self.offset
+        if pos.x() < self.LABEL_WIDTH or not 0 <= row < 7 or not 0 <= i < self.days:
+            return None
+        return i
+
+    def mouseMoveEvent(self, event):
+        i = self.dayAt(event.pos())
+        if i is None:
+            self.setToolTip("")
+            return
+        year, month, dom = ts_date(self.start + i * DAY)
+        count = "..." if self.counts is None else self.counts[i]
+        self.setToolTip(f"{calendar.month_abbr[month]} {dom}, {year}: {count} events")
+
+    def mousePressEvent(self, event):
+        i = self.dayAt(event.pos())
+        if i is not None:
+            self.daySelected.emit(*ts_date(self.start + i * DAY))
+
+
+class YearView(QWidget):
+    daySelected = pyqtSignal(int, int, int)
+
+    def __init__(self, year):
+        QWidget.__init__(self)
+        self.setWindowTitle("Year overview")
+        self.setGeometry(QRect(100, 100, 760, 420))
+        self.firstYear = year
+        self.counts    = {}
+        self.workers   = {}
+        self.heatmaps  = []
+
+        layout = QVBoxLayout(self)
+        controls = QHBoxLayout()
+        self.prevBtn = QPushButton("<", self)
+        self.prevBtn.clicked.connect(self.onPrevious)
+        self.nextBtn = QPushButton(">", self)
+        self.nextBtn.clicked.connect(self.onNext)
+        self.yearsInput = QSpinBox(self)
+        self.yearsInput.setRange(1, 10)
+        self.yearsInput.setPrefix("Years: ")
+        self.yearsInput.valueChanged.connect(self.showYears)
+        controls.addWidget(self.prevBtn)
+        controls.addWidget(self.nextBtn)
+        controls.addStretch()
+        controls.addWidget(self.yearsInput)
+        layout.addLayout(controls)
+        self.heatmapLayout = QVBoxLayout()
+        layout.addLayout(self.heatmapLayout)
+        self.setLayout(layout)
+
+        changeSignals.changed.connect(self.onDataChanged)
+        self.showYears()
+        self.show()
+
+    def years(self):
+        return range(self.firstYear, self.firstYear + self.yearsInput.value())
+
+    def onPrevious(self):
+        self.firstYear -= 1
+        self.showYears()
+
+    def onNext(self):
+        self.firstYear += 1
+        self.showYears()
+
+    def showYears(self, *_):
+        for heatmap in self.heatmaps:
+            self.heatmapLayout.removeWidget(heatmap)
+            heatmap.deleteLater()
+        self.heatmaps = []
+        for year in self.years():
+            heatmap = YearHeatmap(year, self)
+            heatmap.daySelected.connect(self.daySelected.emit)
+            self.heatmapLayout.addWidget(heatmap)
+            self.heatmaps.append(heatmap)
+            if year in self.counts:
+                heatmap.setCounts(self.counts[year])
+            else:
+                self.loadYear(year)
+        self.updatePeak()
+
+    def loadYear(self, year):
+        if year in self.workers:
+            self.workers[year].cancel()
+        worker = Worker(storage.year_counts, year)
+        worker.signals.result.connect(partial(self.onYearLoaded, year))
+        worker.signals.error.connect(print)
+        self.workers[year] = worker
+        worker.start()
+
+    def onYearLoaded(self, year, counts):
+        self.workers.pop(year, None)
+        self.counts[year] = counts
+        for heatmap in self.heatmaps:
+            if heatmap.year == year:
+                heatmap.setCounts(counts)
+        self.updatePeak()
+
+    def updatePeak(self):
+        peak = max((max(self.counts[year], default=0) for year in self.years() if year in self.counts), default=0)
+        for heatmap in self.heatmaps:
+            heatmap.setPeak(peak)
+
+    def onDataChanged(self, events):
+        if events is None:
+            years = set(self.counts)
+        else:
+            years = {ts_date(event["start_ts"])[0] for event in events}
+        for year in years:
+            self.counts.pop(year, None)
+            if year in self.years():
+                self.loadYear(year)
+
+
+class SearchView(QWidget):
+    daySelected = pyqtSignal(int, int, int)
+    PAGE_SIZE = 20
+
+    def __init__(self):
+        QWidget.__init__(self)
+        self.setWindowTitle("Search")
+        self.setGeometry(QRect(120, 120, 480, 520))
+        self.page  = 0
+        self.total = 0
+
+        layout = QVBoxLayout(self)
+        self.queryInput = QLineEdit(self)
+        self.queryInput.setPlaceholderText("Search events")
+        self.queryInput.setStyleSheet('background-color: #ffffff; color: #333333; padding: 5px;')
+        self.queryInput.textChanged.connect(self.onQueryChange)
+        self.queryInput.returnPressed.connect(self.openFirst)
+        self.results = QListWidget(self)
+        self.results.itemActivated.connect(self.onResultActivated)
+        self.summary = QLabel("")
+
+        pager = QHBoxLayout()
+        self.prevBtn = QPushButton("<", self)
+        self.prevBtn.clicked.connect(self.onPreviousPage)
+        self.nextBtn = QPushButton(">", self)
+        self.nextBtn.clicked.connect(self.onNextPage)
+        pager.addWidget(self.summary, 1)
+        pager.addWidget(self.prevBtn)
+        pager.addWidget(self.nextBtn)
+
+        layout.addWidget(self.queryInput)
+        layout.addWidget(self.results)
+        layout.addLayout(pager)
+        self.setLayout(layout)
+
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(150)
+        self.debounce.timeout.connect(self.runSearch)
+        self.show()
+
+    def onQueryChange(self, text):
+        self.page = 0
+        self.debounce.start()
+
+    def onPreviousPage(self):
+        if self.page > 0:
+            self.page -= 1
+            self.runSearch()
+
+    def onNextPage(self):
+        if (self.page + 1) * self.PAGE_SIZE < self.total:
+            self.page += 1
+            self.runSearch()
+
+    def runSearch(self):
+        self.results.clear()
+        if not searchIndex.ready:
+            self.summary.setText("Indexing events...")
+            self.debounce.start(500)
+            return
+        self.total, results = searchIndex.search(self.queryInput.text(), self.page, self.PAGE_SIZE)
+        for result in results:
+            year, month, dom = ts_date(result["start_ts"])
+            label = f"{result['event_name']}  -  {calendar.month_abbr[month]} {dom}, {year} {format_time(result['start_ts'])}"
+            if result["rule"]:
+                label += f"  ({result['rule']})"
+            item = QListWidgetItem(label)
+            item.setData(Qt.UserRole, (year, month, dom))
+            self.results.addItem(item)
+        first = self.page * self.PAGE_SIZE
+        self.summary.setText(f"{first + 1}-{first + len(results)} of {self.total}" if results else "No matches")
+        self.prevBtn.setEnabled(self.page > 0)
+        self.nextBtn.setEnabled(first + len(results) < self.total)
+
+    def openFirst(self):
+        if self.results.count():
+            self.onResultActivated(self.results.item(0))
+
+    def onResultActivated(self, item):
+        self.daySelected.emit(*item.data(Qt.UserRole))
+
+
+class FreeTimeView(QWidget):
+    daySelected = pyqtSignal(int, int, int)
+
+    def __init__(self, year, month):
+        QWidget.__init__(self)
+        self.setWindowTitle("Find free time")
+        self.setGeometry(QRect(140, 140, 420, 480))
+        self.worker = None
+        self.searchStarted = None
+
+        layout = QFormLayout(self)
+        self.fromInput = QDateEdit(self)
+        self.fromInput.setCalendarPopup(True)
+        today = QDate.currentDate()
+        self.fromInput.setDate(today if (year, month) == (today.year(), today.month()) else QDate(year, month, 1))
+        self.daysInput = QSpinBox(self)
+        self.daysInput.setRange(1, 366)
+        self.daysInput.setValue(7)
+        self.lengthInput = QSpinBox(self)
+        self.lengthInput.setRange(5, 24 * 60)
+        self.lengthInput.setSingleStep(5)
+        self.lengthInput.setValue(30)
+        self.lengthInput.setSuffix(" min")
+        self.earliestInput = QTimeEdit(self)
+        self.earliestInput.setTime(QTime(9, 0))
+        self.latestInput = QTimeEdit(self)
+        self.latestInput.setTime(QTime(17, 0))
+        self.countInput = QSpinBox(self)
+        self.countInput.setRange(1, 100)
+        self.countInput.setValue(10)
+        self.findBtn = QPushButton("Find", self)
+        self.findBtn.clicked.connect(self.onFind)
+        self.results = QListWidget(self)
+        self.results.itemActivated.connect(self.onResultActivated)
+        self.summary = QLabel(f"Checking {len(calendars)} calendar{'s' if len(calendars) != 1 else ''}")
+
+        layout.addRow("From", self.fromInput)
+        layout.addRow("Days", self.daysInput)
+        layout.addRow("Length", self.lengthInput)
+        layout.addRow("Between", self.earliestInput)
+        layout.addRow("and", self.latestInput)
+        layout.addRow("Slots", self.countInput)
+        layout.addRow(self.findBtn)
+        layout.addRow(self.results)
+        layout.addRow(self.summary)
+        self.setLayout(layout)
+        self.show()
+
+    def onFind(self):
+        date = self.fromInput.date()
+        start = to_timestamp(date.year(), date.month(), date.day())
+        earliest, latest = self.earliestInput.time(), self.latestInput.time()
+        day_start = (earliest.hour() * 3600 + earliest.minute() * 60) // SLOT
+        day_end = -(-(latest.hour() * 3600 + latest.minute() * 60) // SLOT)
+        if self.worker is not None:
+            self.worker.cancel()
+        self.findBtn.setEnabled(False)
+        self.searchStarted = time.perf_counter()
+        self.worker = Worker(find_free_time, calendars, start, self.daysInput.value(), self.lengthInput.value(),
+                             self.countInput.value(), day_start, day_end, now_ts())
+        self.worker.signals.result.connect(self.onFound)
+        self.worker.signals.error.connect(self.onFindError)
+        self.worker.start()
+
+    def onFound(self, slots):
+        self.findBtn.setEnabled(True)
+        self.results.clear()
+        for slot_start, slot_end in slots:
+            year, month, dom = ts_date(slot_start)
+            item = QListWidgetItem(f"{WEEKDAYS[calendar.weekday(year, month, dom)]}. {calendar.month_abbr[month]} {dom}, "
+                                   f"{year}  {format_time(slot_start)} - {format_time(slot_end)}")
+            item.setData(Qt.UserRole, (year, month, dom))
+            self.results.addItem(item)
+        elapsed = (time.perf_counter() - self.searchStarted) * 1000
+        self.summary.setText(f"{len(slots)} free slot{'s' if len(slots) != 1 else ''} across {len(calendars)} "
+                             f"calendar{'s' if len(calendars) != 1 else ''} ({elapsed:.0f} ms)")
+
+    def onFindError(self, e):
+        self.findBtn.setEnabled(True)
+        self.summary.setText(f"Could not check calendars: {e}")
+
+    def onResultActivated(self, item):
+        self.daySelected.emit(*item.data(Qt.UserRole))
 
 
 class App(QMainWindow):
@@ -31,22 +744,8 @@ class App(QMainWindow):
     def __init__(self):
         super().__init__()
 
-        self.days = []
-        self.months = {
-            "January":   1,
-            "February":  2,
-            "March":     3,
-            "April":     4,
-            "May":       5,
-            "June":      6,
-            "July":      7,
-            "August":    8,
-            "September": 9,
-            "October":   10,
-            "November":  11,
-            "December":  12
-        }
-        self.year = 2021
+        self.months = MONTH_NUMBERS
+        self.year = datetime.now().year
         self.current_month = datetime.now().strftime('%B')
         self.month = self.months[self.current_month]
 
@@ -60,6 +759,7 @@ class App(QMainWindow):
         self.statusBar.showMessage('Message in statusbar.')
         self.statusBar.setStyleSheet("color: #333333; font-size: 14px;")
         self.setStatusBar(self.statusBar)
+        self.metricsShortcut = QShortcut(QKeySequence("F12"), self)
 
         self.fileMenu = self.menuBar.addMenu('&File')
         self.newProjectAction = QAction('New Project...')
@@ -92,12 +792,36 @@ class App(QMainWindow):
         self.setCentralWidget(self.mainFrame)
         self.calendarLayout = QVBoxLayout(self)
         self.mainFrame.setLayout(self.calendarLayout)
-        self.calendar = QTableWidget(self)
+        self.calendar = QTableView(self)
+        self.calendarModel = MonthModel(self)
 
         self.calendarLabel = QLabel("")
 
         self.fullScreen = False
         self.popup = None
+        self.yearView = None
+        self.searchView = None
+        self.freeTimeView = None
+        self.tray = QSystemTrayIcon(self) if QSystemTrayIcon.isSystemTrayAvailable() else None
+        self.monthWorker = None
+        self.prefetching = set()
+        self.monthLoading = False
+        self.monthRequested = None
+        self.painted = False
+        self.loopMonitor = EventLoopMonitor(parent=self)
+        self.metricsLabel = QLabel("")
+        self.syncLabel = QLabel("")
+        self.metricsPanel = None
+        self.metricsFile = config.get("METRICS_FILE")
+        self.metricsTimer = QTimer(self)
+        self.metricsTimer.timeout.connect(self.refreshMetrics)
+        self.metricsTicks = 0
+        writeSignals.queued.connect(self.onEventQueued)
+        writeSignals.flushed.connect(self.onEventsFlushed)
+        writeSignals.failed.connect(self.onWriteFailed)
+        changeSignals.changed.connect(self.onDataChanged)
+        reminderSignals.due.connect(self.onReminderDue)
+        syncSignals.status.connect(self.onSyncStatus)
         self.initUI()
 
     def initUI(self):
@@ -132,6 +856,11 @@ class App(QMainWindow):
 
         self.fileMenu.addSeparator()
 
+        self.statusBar.addPermanentWidget(self.syncLabel)
+        self.statusBar.addPermanentWidget(self.metricsLabel)
+        self.metricsShortcut.activated.connect(self.toggleMetricsPanel)
+        self.metricsTimer.start(1000)
+
         self.exitAction.setShortcut('Ctrl+Q')
         self.exitAction.setStatusTip('Exit application')
         self.exitAction.triggered.connect(qApp.quit)
@@ -143,30 +872,54 @@ class App(QMainWindow):
         self.windowControlLayout.addWidget(self.close_btn)
 
         self.min_btn.setStyleSheet("width: 30px; height:20px; border: none;")
-        self.min_btn.setIcon(qta.icon('fa5s.window-minimize', color="#333333"))
         self.min_btn.setIconSize(QSize(20, 20))
         self.min_btn.setCursor(QCursor(Qt.CursorShape.PointingHandCursor))
         self.min_btn.clicked.connect(self.minButton)
 
         self.max_btn.setStyleSheet("width: 30px; height:20px; border: none;")
-        self.max_btn.setIcon(qta.icon('fa5s.window-maximize', color="#333333"))
         self.max_btn.setIconSize(QSize(20, 20))
         self.max_btn.setCursor(QCursor(Qt.CursorShape.PointingHandCursor))
         self.max_btn.clicked.connect(self.maxButton)
 
         self.close_btn.setStyleSheet("width: 30px; height:20px; border: none;")
-        self.close_btn.setIcon(qta.icon('fa5s.times', color="#333333"))
         self.close_btn.setIconSize(QSize(20, 20))
         self.close_btn.setCursor(QCursor(Qt.CursorShape.PointingHandCursor))
         self.close_btn.clicked.connect(self.closeButton)
 
-        monthSelect = QComboBox(self)
-        for month in self.months.keys():
-            monthSelect.addItem(month)
+        navigation = QHBoxLayout()
+        self.prevYearBtn = QPushButton("<", self)
+        self.prevYearBtn.clicked.connect(self.onPreviousYear)
+        self.yearLabel = QLabel(str(self.year))
+        self.nextYearBtn = QPushButton(">", self)
+        self.nextYearBtn.clicked.connect(self.onNextYear)
 
-        monthSelect.activated[str].connect(self.onMonthChange)
-        monthSelect.setStyleSheet('background-color: #ffffff; color: #333333; padding: 5px;')
-        self.calendarLayout.addWidget(monthSelect)
+        self.monthSelect = QComboBox(self)
+        for month in self.months.keys():
+            self.monthSelect.addItem(month)
+        self.monthSelect.setCurrentIndex(self.month - 1)
+
+        self.monthSelect.activated[str].connect(self.onMonthChange)
+        self.monthSelect.setStyleSheet('background-color: #ffffff; color: #333333; padding: 5px;')
+
+        self.yearViewBtn = QPushButton("Year view", self)
+        self.yearViewBtn.setShortcut('Ctrl+Y')
+        self.yearViewBtn.clicked.connect(self.showYearView)
+
+        self.searchBtn = QPushButton("Search", self)
+        self.searchBtn.setShortcut('Ctrl+F')
+        self.searchBtn.clicked.connect(self.showSearch)
+
+        self.freeTimeBtn = QPushButton("Free time", self)
+        self.freeTimeBtn.clicked.connect(self.showFreeTime)
+
+        navigation.addWidget(self.prevYearBtn)
+        navigation.addWidget(self.yearLabel)
+        navigation.addWidget(self.nextYearBtn)
+        navigation.addWidget(self.monthSelect, 1)
+        navigation.addWidget(self.yearViewBtn)
+        navigation.addWidget(self.searchBtn)
+        navigation.addWidget(self.freeTimeBtn)
+        self.calendarLayout.addLayout(navigation)
         self.createCalendar()
         self.calendarLayout.addWidget(self.calendarLabel)
         self.setWindowFlags(Qt.FramelessWindowHint)
@@ -174,187 +927,236 @@ class App(QMainWindow):
 
         self.show()
 
-    @staticmethod
-    def connectDB():
-        return connect(host=config["MYSQL_HOST"],
-                       user=config["MYSQL_USER"],
-                       password=config["MYSQL_PASS"],
-                       db=config["MYSQL_DB"],
-                       charset='utf8mb4',
-                       cursorclass=cursors.DictCursor)
-
-    def get_num_events(self, day):
-        connection = self.connectDB()
-        events = []
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    f'''SELECT * FROM `events` WHERE month={self.month} AND day={day} AND year={self.year}''')
-            events = cursor.fetchall()
-        finally:
-            connection.close()
-            return len(events)
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            self.painted = True
+            profiler.mark("first paint")
+            QTimer.singleShot(0, self.afterFirstPaint)
+
+    def afterFirstPaint(self):
+        self.loadIcons()
+        self.loadMonth()
+        remoteWatcher.start()
+        reminders.start()
+        self.indexWorker = Worker(searchIndex.build, storage).start()
+
+    def loadIcons(self):
+        import qtawesome as qta
+        self.min_btn.setIcon(qta.icon('fa5s.window-minimize', color="#333333"))
+        self.max_btn.setIcon(qta.icon('fa5s.window-maximize', color="#333333"))
+        self.close_btn.setIcon(qta.icon('fa5s.times', color="#333333"))
+        if self.tray is not None:
+            self.tray.setIcon(qta.icon('fa5s.calendar-alt', color="#333333"))
+            self.tray.setToolTip(self.title)
+            self.tray.show()
 
     def createCalendar(self):
-        self.calendar.setRowCount(len(cal.monthdayscalendar(self.year, self.month)))
+        self.calendar.setModel(self.calendarModel)
+        self.calendar.setItemDelegate(DayCellDelegate(self.calendar))
         self.calendar.horizontalHeader().setStretchLastSection(True)
         self.calendar.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.calendar.verticalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.calendar.setColumnCount(7)
         self.calendar.verticalHeader().setVisible(False)
-        days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-        self.calendar.setHorizontalHeaderLabels(days)
+        self.calendar.setMouseTracking(True)
         self.calendar.clicked.connect(self.showDay)
+        self.calendarLayout.addWidget(self.calendar)
+        self.calendarModel.setMonth(self.year, self.month)
 
-        for i, week in enumerate(cal.monthdayscalendar(self.year, self.month)):
-            self.days.append([])
-            for j, day in enumerate(week):
-                self.days[i].append(Day(self.month, self.year, day, days[j]))
-
-        for i, week in enumerate(self.days):
-            monday_events = self.get_num_events(week[0])
-            day_num = QLabel(f"{week[0]}")
-            if monday_events > 0:
-                if monday_events > 1:
-                    monday = QLabel(f"{monday_events} events")
-                else:
-                    monday = QLabel(f"{monday_events} event")
-            else:
-                monday = QLabel("")
-            monday.setStatusTip(week[0].toString())
-
-            cell_layout = QVBoxLayout()
-            cell_layout.addWidget(day_num)
-            cell_layout.addWidget(monday)
-
-            cellWidget = QWidget()
-            cellWidget.setLayout(cell_layout)
-
-            tuesday_events = self.get_num_events(week[1])
-            day_num1 = QLabel(f"{week[1]}")
-            if tuesday_events > 0:
-                if tuesday_events > 1:
-                    tuesday = QLabel(f"{tuesday_events} events")
-                else:
-                    tuesday = QLabel(f"{tuesday_events} event")
-            else:
-                tuesday = QLabel("")
-            tuesday.setStatusTip(week[1].toString())
-
-            cell_layout1 = QVBoxLayout()
-            cell_layout1.addWidget(day_num1)
-            cell_layout1.addWidget(tuesday)
-
-            cellWidget1 = QWidget()
-            cellWidget1.setLayout(cell_layout1)
-
-            wednesday_events = self.get_num_events(week[2])
-            day_num2 = QLabel(f"{week[2]}")
-            if wednesday_events > 0:
-                if wednesday_events > 1:
-                    wednesday = QLabel(f"{wednesday_events} events")
-                else:
-                    wednesday = QLabel(f"{wednesday_events} event")
-            else:
-                wednesday = QLabel("")
-            wednesday.setStatusTip(week[2].toString())
-
-            cell_layout2 = QVBoxLayout()
-            cell_layout2.addWidget(day_num2)
-            cell_layout2.addWidget(wednesday)
-
-            cellWidget2 = QWidget()
-            cellWidget2.setLayout(cell_layout2)
-
-            thursday_events = self.get_num_events(week[3])
-            day_num3 = QLabel(f"{week[3]}")
-            if thursday_events > 0:
-                if thursday_events > 1:
-                    thursday = QLabel(f"{thursday_events} events")
-                else:
-                    thursday = QLabel(f"{thursday_events} event")
-            else:
-                thursday = QLabel("")
-            thursday.setStatusTip(week[3].toString())
-
-            cell_layout3 = QVBoxLayout()
-            cell_layout3.addWidget(day_num3)
-            cell_layout3.addWidget(thursday)
-
-            cellWidget3 = QWidget()
-            cellWidget3.setLayout(cell_layout3)
-
-            friday_events = self.get_num_events(week[4])
-            day_num4 = QLabel(f"{week[4]}")
-            if friday_events > 0:
-                if friday_events > 1:
-                    friday = QLabel(f"{friday_events} events")
-                else:
-                    friday = QLabel(f"{friday_events} event")
-            else:
-                friday = QLabel("")
-            friday.setStatusTip(week[4].toString())
-
-            cell_layout4 = QVBoxLayout()
-            cell_layout4.addWidget(day_num4)
-            cell_layout4.addWidget(friday)
-
-            cellWidget4 = QWidget()
-            cellWidget4.setLayout(cell_layout4)
-
-            saturday_events = self.get_num_events(week[5])
-            day_num5 = QLabel(f"{week[5]}")
-            if saturday_events > 0:
-                if saturday_events > 1:
-                    saturday = QLabel(f"{saturday_events} events")
-                else:
-                    saturday = QLabel(f"{saturday_events} event")
-            else:
-                saturday = QLabel("")
-            saturday.setStatusTip(week[5].toString())
-
-            cell_layout5 = QVBoxLayout()
-            cell_layout5.addWidget(day_num5)
-            cell_layout5.addWidget(saturday)
-
-            cellWidget5 = QWidget()
-            cellWidget5.setLayout(cell_layout5)
-
-            sunday_events = self.get_num_events(week[6])
-            day_num6 = QLabel(f"{week[6]}")
-            if sunday_events > 0:
-                if sunday_events > 1:
-                    sunday = QLabel(f"{sunday_events} events")
-                else:
-                    sunday = QLabel(f"{sunday_events} event")
+    @staticmethod
+    def fetch_month(year, month):
+        version = monthCache.version((year, month))
+        month_events = storage.month_counts(year, month)
+        monthCache.put((year, month), month_events, version)
+        return month_events
+
+    def loadMonth(self):
+        if self.monthWorker is not None:
+            self.monthWorker.cancel()
+        month_events = monthCache.get((self.year, self.month))
+        if month_events is not None:
+            self.monthWorker = None
+            self.onMonthLoaded(self.year, self.month, month_events)
+            return
+        self.monthLoading = True
+        self.monthRequested = time.perf_counter()
+        self.monthWorker = Worker(self.fetch_month, self.year, self.month)
+        self.monthWorker.signals.result.connect(partial(self.onMonthLoaded, self.year, self.month))
+        self.monthWorker.signals.error.connect(self.onLoadError)
+        self.monthWorker.start()
+
+    def onMonthLoaded(self, year, month, month_events):
+        if (year, month) != (self.year, self.month):
+            return
+        self.monthLoading = False
+        if self.monthRequested is not None:
+            metrics.record("ui.month render", (time.perf_counter() - self.monthRequested) * 1000, sum(month_events.values()))
+            self.monthRequested = None
+        profiler.mark("data ready")
+        start, end = month_range(year, month)
+        pending = writeQueue.pending_between(start, end)
+        if pending:
+            month_events = dict(month_events)
+            for event in pending:
+                day = (event["start_ts"] - start) // DAY + 1
+                month_events[day] = month_events.get(day, 0) + 1
+        self.calendarModel.setCounts(year, month, month_events)
+        self.prefetchAdjacent()
+
+    def refreshCounts(self):
+        month_events = monthCache.get((self.year, self.month))
+        if month_events is not None:
+            self.onMonthLoaded(self.year, self.month, month_events)
+
+    def onEventQueued(self, event):
+        if tuple(ts_date(event["start_ts"])[:2]) == (self.year, self.month):
+            self.refreshCounts()
+
+    def onEventsFlushed(self, events):
+        self.statusBar.showMessage(f"Saved {len(events)} event{'s' if len(events) > 1 else ''}")
+
+    def onDataChanged(self, events):
+        if events is None:
+            monthCache.clear()
+            dayCache.clear()
+            self.loadMonth()
+            return
+
+        days = set()
+        for event in events:
+            year, month, dom = ts_date(event["start_ts"])
+            dayCache.invalidate((year, month, dom))
+            if (year, month) == (self.year, self.month):
+                days.add(dom)
             else:
-                sunday = QLabel("")
-            sunday.setStatusTip(week[6].toString())
-
-            cell_layout6 = QVBoxLayout()
-            cell_layout6.addWidget(day_num6)
-            cell_layout6.addWidget(sunday)
+                monthCache.invalidate((year, month))
+        if not days:
+            return
+        if self.monthLoading or len(days) > 10:
+            monthCache.invalidate((self.year, self.month))
+            self.loadMonth()
+            return
+        for dom in days:
+            worker = Worker(storage.day_count, self.year, self.month, dom)
+            worker.signals.result.connect(partial(self.onDayLoaded, self.year, self.month, dom))
+            worker.signals.error.connect(self.onLoadError)
+            worker.start()
+
+    def onDayLoaded(self, year, month, dom, count):
+        start = to_timestamp(year, month, dom)
+        monthCache.update_day((year, month), dom, count)
+        count += len(writeQueue.pending_between(start, start + DAY))
+        self.calendarModel.setCount(year, month, dom, count)
+
+    def onWriteFailed(self, events, error, will_retry):
+        if will_retry:
+            self.statusBar.showMessage(f"Could not save {len(events)} event(s), retrying: {error}")
+            return
+        self.statusBar.showMessage(f"Gave up saving {len(events)} event(s): {error}")
+        if (self.year, self.month) in months_of(events):
+            self.refreshCounts()
+
+    def prefetchAdjacent(self):
+        previous = (self.year - 1, 12) if self.month == 1 else (self.year, self.month - 1)
+        following = (self.year + 1, 1) if self.month == 12 else (self.year, self.month + 1)
+        for key in (previous, following):
+            if key in monthCache or key in self.prefetching:
+                continue
+            self.prefetching.add(key)
+            worker = Worker(self.fetch_month, *key)
+            worker.signals.result.connect(partial(self.onPrefetched, key))
+            worker.signals.error.connect(partial(self.onPrefetched, key))
+            worker.start()
+
+    def onPrefetched(self, key, _):
+        self.prefetching.discard(key)
+
+    def refreshMetrics(self):
+        queries = metrics.totals("db.")
+        stall = self.loopMonitor.takeWorst()
+        self.metricsLabel.setText(f"{queries['count']} queries, p99 {queries['p99_ms']:.0f} ms, "
+                                  f"worst stall {stall:.0f} ms")
+        if self.metricsPanel is not None and self.metricsPanel.isVisible():
+            self.metricsPanel.refresh()
+        self.metricsTicks += 1
+        if self.metricsFile and self.metricsTicks % int(config.get("METRICS_INTERVAL") or 10) == 0:
+            metrics.dump(self.metricsFile)
+
+    def toggleMetricsPanel(self):
+        if self.metricsPanel is None:
+            self.metricsPanel = MetricsPanel()
+        if self.metricsPanel.isVisible():
+            self.metricsPanel.hide()
+        else:
+            self.metricsPanel.refresh()
+            self.metricsPanel.show()
 
-            cellWidget6 = QWidget()
-            cellWidget6.setLayout(cell_layout6)
+    def onSyncStatus(self, online, queued):
+        if online:
+            self.syncLabel.setText(f"Syncing {queued} change{'s' if queued != 1 else ''}" if queued else "")
+        else:
+            self.syncLabel.setText(f"Offline, {queued} change{'s' if queued != 1 else ''} queued")
 
-            self.calendar.setCellWidget(i, 0, cellWidget)
-            self.calendar.setCellWidget(i, 1, cellWidget1)
-            self.calendar.setCellWidget(i, 2, cellWidget2)
-            self.calendar.setCellWidget(i, 3, cellWidget3)
-            self.calendar.setCellWidget(i, 4, cellWidget4)
-            self.calendar.setCellWidget(i, 5, cellWidget5)
-            self.calendar.setCellWidget(i, 6, cellWidget6)
+    def onReminderDue(self, event):
+        text = f"{format_time(event['start_ts'])} {event['event_name']}"
+        self.statusBar.showMessage(f"Reminder: {text}")
+        if self.tray is not None:
+            self.tray.showMessage(self.title, text)
 
-        self.calendarLayout.addWidget(self.calendar)
+    def onLoadError(self, e):
+        self.monthLoading = False
+        self.monthRequested = None
+        self.statusBar.showMessage(f"Could not load events: {e}")
 
     def showDay(self, cell):
-        self.popup = DayView(self.days[cell.row()][cell.column()])
+        day = self.calendarModel.day(cell)
+        if day.dom:
+            self.popup = DayView(day)
 
     def onMonthChange(self, text):
-        self.month = self.months[text]
-        self.days = []
-        self.createCalendar()
+        self.showMonth(self.year, self.months[text])
+
+    def onPreviousYear(self):
+        self.showMonth(self.year - 1, self.month)
+
+    def onNextYear(self):
+        self.showMonth(self.year + 1, self.month)
+
+    def showMonth(self, year, month):
+        self.year, self.month = year, month
+        self.yearLabel.setText(str(year))
+        self.monthSelect.setCurrentIndex(month - 1)
+        self.calendarModel.setMonth(year, month)
+        self.loadMonth()
+
+    def showYearView(self):
+        if self.yearView is None:
+            self.yearView = YearView(self.year)
+            self.yearView.daySelected.connect(self.onYearDaySelected)
+        self.yearView.show()
+        self.yearView.raise_()
+
+    def onYearDaySelected(self, year, month, dom):
+        self.showMonth(year, month)
+
+    def showSearch(self):
+        if self.searchView is None:
+            self.searchView = SearchView()
+            self.searchView.daySelected.connect(self.openDay)
+        self.searchView.show()
+        self.searchView.raise_()
+        self.searchView.queryInput.setFocus()
+
+    def showFreeTime(self):
+        if self.freeTimeView is None:
+            self.freeTimeView = FreeTimeView(self.year, self.month)
+            self.freeTimeView.daySelected.connect(self.openDay)
+        self.freeTimeView.show()
+        self.freeTimeView.raise_()
+
+    def openDay(self, year, month, dom):
+        self.showMonth(year, month)
+        self.popup = DayView(Day(month, year, dom, WEEKDAYS[calendar.weekday(year, month, dom)]))
 
     def mousePressEvent(self, event):
         self.oldPos = event.globalPos()
@@ -388,6 +1190,9 @@ class App(QMainWindow):
 
     @pyqtSlot()
     def closeButton(self):
+        writeQueue.wait(timeout=10)
+        if self.metricsFile:
+            metrics.dump(self.metricsFile)
         sys.exit()
 
 
@@ -478,92 +1283,126 @@ class DayView(QWidget):
         eventTimeLayout.addWidget(endLabel)
         eventTimeLayout.addItem(endLayout)
 
+        self.startHourValue = self.startHour.currentText()
+        self.startMinValue = self.startMin.currentText()
+        self.startAmPmValue = self.startAmPm.currentText()
+        self.endHourValue = self.endHour.currentText()
+        self.endMinValue = self.endMin.currentText()
+        self.endAmPmValue = self.endAmPm.currentText()
+
         layout.addRow(eventTimeLayout)
 
+        repeatLayout = QHBoxLayout()
+        repeatLabel = QLabel("Repeat:")
+        self.repeat = QComboBox(self)
+        for option in ["Never", "Daily", "Weekly", "Monthly", "Yearly"]:
+            self.repeat.addItem(option)
+        self.repeat.activated[str].connect(self.onRepeatChange)
+        self.repeatCount = QSpinBox(self)
+        self.repeatCount.setRange(0, 999)
+        self.repeatCount.setSpecialValueText("Forever")
+        self.repeatCount.setSuffix(" times")
+        self.repeatCount.setEnabled(False)
+        repeatLayout.addWidget(repeatLabel)
+        repeatLayout.addWidget(self.repeat)
+        repeatLayout.addWidget(self.repeatCount)
+        layout.addRow(repeatLayout)
+        self.repeatValue = self.repeat.currentText()
+
         self.addEventBtn = QPushButton("Add")
         self.addEventBtn.clicked.connect(self.onAddEvent)
         self.addEventBtn.setStyleSheet('padding: 5px; background-color: #666666; color: #cccccc;')
         layout.addRow(self.addEventBtn)
 
-        self.calendar = QTableWidget(self)
-        self.calendar.setRowCount(24)
-
-        self.calendar.setColumnCount(2)
+        self.model = AgendaModel(self)
+        self.model.loadedAll.connect(self.onAllLoaded)
+        self.calendar = QTableView(self)
+        self.calendar.setModel(self.model)
         self.calendar.verticalHeader().setVisible(False)
-        self.calendar.setHorizontalHeaderLabels(["Time", "Event"])
+        self.calendar.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.calendar.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.calendar.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.calendar.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.calendar.customContextMenuRequested.connect(self.onEventMenu)
         header = self.calendar.horizontalHeader()
         header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
         header.setSectionResizeMode(1, QHeaderView.Stretch)
 
-        self.calendar.clicked.connect(self.showSlot)
-        times = ["12:00 AM",
-                 "1:00 AM",
-                 "2:00 AM",
-                 "3:00 AM",
-                 "4:00 AM",
-                 "5:00 AM",
-                 "6:00 AM",
-                 "7:00 AM",
-                 "8:00 AM",
-                 "9:00 AM",
-                 "10:00 AM",
-                 "11:00 AM",
-                 "12:00 PM",
-                 "1:00 PM",
-                 "2:00 PM",
-                 "3:00 PM",
-                 "4:00 PM",
-                 "5:00 PM",
-                 "6:00 PM",
-                 "7:00 PM",
-                 "8:00 PM",
-                 "9:00 PM",
-                 "10:00 PM",
-                 "11:00 PM"]
-        for i, time_slot in enumerate(times):
-            self.calendar.setItem(i, 0, QTableWidgetItem(time_slot))
-
-        connection = self.connectDB()
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute(f'''SELECT * FROM `events` WHERE month={self.day.month} AND day={self.day.dom} AND year={self.day.year} ORDER BY id DESC''')
-            events = cursor.fetchall()
-            for event in events:
-
-                if event["start_ampm"] == "AM":
-                    row = int(event["start_hour"])+1
-                    cell_data = QLabel(f"{event['start_hour']}:{event['start_min']} {event['start_ampm']} {event['event_name']}")
-
-                else:
-                    row = int(event["start_hour"])+12
-                    cell_data = QLabel(f"{event['start_hour']}:{event['start_min']} {event['start_ampm']} {event['event_name']}")
-
-                cell_layout = QVBoxLayout()
-                cell_layout.addWidget(cell_data)
-
-                cellWidget = QWidget()
-                cellWidget.setLayout(cell_layout)
-                self.calendar.setCellWidget(row, 1, cellWidget)
-
-        finally:
-            connection.close()
-
         layout.addRow(self.calendar)
         self.setLayout(layout)
 
+        self.dayWorker = None
+        self.dayRequested = None
+        self.dayVersion = None
+        self.addWorker = None
+        self.conflictWorker = None
+        writeSignals.queued.connect(self.onWritesChanged)
+        writeSignals.failed.connect(self.onWriteFailed)
+        changeSignals.changed.connect(self.onDataChanged)
         self.init()
 
     def init(self):
         self.show()
+        self.loadEvents()
+
+    # Only the first page is loaded up front; the model asks for the rest as rows scroll
+    # into view. A day that has been read to the end once is paged out of its cached columns.
+    def loadEvents(self, cached=True):
+        if self.dayWorker is not None:
+            self.dayWorker.cancel()
+        self.dayRequested = time.perf_counter()
+        start, end = self.dayRange()
+        pending = writeQueue.pending_between(start, end)
+        day_events = dayCache.get(self.dayKey()) if cached else None
+        if day_events is not None:
+            self.dayWorker = None
+            pager = columns_pager(day_events, start, end, pending)
+            self.onEventsLoaded((pager, pager.next_page()))
+            return
+        self.dayVersion = dayCache.version(self.dayKey())
+        self.dayWorker = Worker(self.firstPage, start, end, pending)
+        self.dayWorker.signals.result.connect(self.onEventsLoaded)
+        self.dayWorker.signals.error.connect(print)
+        self.dayWorker.start()
 
     @staticmethod
-    def connectDB():
-        return connect(host=config["MYSQL_HOST"],
-                       user=config["MYSQL_USER"],
-                       password=config["MYSQL_PASS"],
-                       db=config["MYSQL_DB"],
-                       charset='utf8mb4',
-                       cursorclass=cursors.DictCursor)
+    def firstPage(start, end, pending):
+        pager = storage_pager(storage, start, end, pending)
+        return pager, pager.next_page()
+
+    def dayKey(self):
+        return self.day.year, self.day.month, self.day.dom
+
+    def dayRange(self):
+        start = to_timestamp(self.day.year, self.day.month, self.day.dom)
+        return start, start + DAY
+
+    def onEventsLoaded(self, loaded):
+        pager, rows = loaded
+        self.model.setPager(pager, rows)
+        metrics.record("ui.day view", (time.perf_counter() - self.dayRequested) * 1000, len(rows))
+
+    # Unsaved writes are left out: they are merged in again from the write queue on every load.
+    def onAllLoaded(self, pager):
+        if pager.in_memory:
+            return
+        saved = [event for event in self.model.rows if event.get("id") is not None or event.get("recurrence_id") is not None]
+        dayCache.put(self.dayKey(), EventColumns.from_events(saved), self.dayVersion)
+
+    def onWritesChanged(self, event):
+        start, end = self.dayRange()
+        if start <= event["start_ts"] < end:
+            self.loadEvents()
+
+    def onDataChanged(self, events):
+        start, end = self.dayRange()
+        if events is None or any(start <= event["start_ts"] < end for event in events):
+            self.loadEvents(cached=False)
+
+    def onWriteFailed(self, events, error, will_retry):
+        start, end = self.dayRange()
+        if not will_retry and any(start <= event["start_ts"] < end for event in events):
+            self.loadEvents()
 
     def onStartHourChange(self, text):
         self.startHourValue = text
@@ -583,71 +1422,105 @@ class DayView(QWidget):
     def onEndAmPmChange(self, text):
         self.endAmPmValue = text
 
-    def showSlot(self, cell):
-        print(cell.row())
+    def onRepeatChange(self, text):
+        self.repeatValue = text
+        self.repeatCount.setEnabled(text != "Never")
+
+    def onEventMenu(self, pos):
+        event = self.calendar.indexAt(pos).data(AgendaModel.EventRole)
+        if event is None or event.get("recurrence_id") is None:
+            return
+        menu = QMenu(self)
+        skip = menu.addAction("Skip this occurrence")
+        if menu.exec_(self.calendar.viewport().mapToGlobal(pos)) is not skip:
+            return
+        exception = {"recurrence_id": event["recurrence_id"],
+                     "occurrence_ts": event["occurrence_ts"],
+                     "cancelled":     True}
+        self.addWorker = Worker(storage.add_exception, exception)
+        self.addWorker.signals.result.connect(partial(self.onEventAdded, [{"start_ts": event["occurrence_ts"]}]))
+        self.addWorker.signals.error.connect(self.onAddError)
+        self.addWorker.start()
 
     def onAddEvent(self):
-        connection = self.connectDB()
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute('''INSERT INTO `events` 
-                               (event_name, start_hour, start_min, start_ampm, end_hour, end_min, end_ampm, month, day, year, date_passed, date_set) 
-                               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
-                               (self.eventName, self.startHourValue, self.startMinValue, self.startAmPmValue, self.endHourValue, self.endMinValue, self.endAmPmValue, self.day.month, self.day.dom, self.day.year, False, datetime.utcnow()))
-        except Exception as e:
-            print(e)
-        finally:
-            connection.close()
+        event = {"event_name":  self.eventName,
+                 "start_hour":  self.startHourValue,
+                 "start_min":   self.startMinValue,
+                 "start_ampm":  self.startAmPmValue,
+                 "end_hour":    self.endHourValue,
+                 "end_min":     self.endMinValue,
+                 "end_ampm":    self.endAmPmValue,
+                 "month":       self.day.month,
+                 "day":         self.day.dom,
+                 "year":        self.day.year,
+                 "date_passed": False,
+                 "date_set":    datetime.utcnow()}
+        start_ts, end_ts = event_timestamps(event)
+        self.addEventBtn.setEnabled(False)
+        self.conflictWorker = Worker(self.findConflicts, start_ts, end_ts)
+        self.conflictWorker.signals.result.connect(partial(self.onConflictsFound, event, start_ts, end_ts))
+        self.conflictWorker.signals.error.connect(self.onAddError)
+        self.conflictWorker.start()
+
+    # The agenda may only have loaded its first pages, so conflicts are looked up for
+    # just the new event's window rather than read off the rows on screen.
+    @staticmethod
+    def findConflicts(start_ts, end_ts):
+        events = storage.range_events(start_ts - DAY, end_ts) + writeQueue.pending_between(start_ts - DAY, end_ts)
+        return IntervalIndex.from_events(events).overlapping(start_ts, end_ts)
+
+    def onConflictsFound(self, event, start_ts, end_ts, conflicts):
+        self.addEventBtn.setEnabled(True)
+        if conflicts:
+            conflicts.sort(key=lambda conflict: conflict["start_ts"])
+            names = ", ".join(f"{conflict['event_name']} ({format_time(conflict['start_ts'])})" for conflict in conflicts[:5])
+            if len(conflicts) > 5:
+                names += f" and {len(conflicts) - 5} more"
+            answer = QMessageBox.question(self, "Scheduling conflict",
+                                          f"This event overlaps {names}. Add it anyway?")
+            if answer != QMessageBox.Yes:
+                return
+        if self.repeatValue == "Never":
+            writeQueue.submit(event)
+        else:
+            self.addEventBtn.setEnabled(False)
+            rule = RecurrenceRule(self.repeatValue.upper(), count=self.repeatCount.value() or None)
+            recurrence = {"event_name": self.eventName,
+                          "start_ts":   start_ts,
+                          "duration":   end_ts - start_ts,
+                          "rule":       str(rule),
+                          "date_set":   event["date_set"]}
+            self.addWorker = Worker(storage.add_recurrence, recurrence)
+            self.addWorker.signals.result.connect(partial(self.onRecurrenceAdded, recurrence))
+            self.addWorker.signals.error.connect(self.onAddError)
+            self.addWorker.start()
+
+    def onRecurrenceAdded(self, recurrence, recurrence_id):
+        self.addEventBtn.setEnabled(True)
+        changeFeed.publish_series(dict(recurrence, id=recurrence_id))
+
+    def onEventAdded(self, changes, _):
+        self.addEventBtn.setEnabled(True)
+        changeFeed.publish(changes)
+
+    def onAddError(self, e):
+        self.addEventBtn.setEnabled(True)
+        print(e)
 
     def onEventNameChange(self, text):
         self.eventName = text
 
 
-class Day:
-    def __init__(self, month, year, dom, dow):
-        self.month  = month
-        self.year   = year
-        self.dom    = dom
-        self.dow    = dow
-        self.events = []
-        self.months = {
-            "January":   1,
-            "February":  2,
-            "March":     3,
-            "April":     4,
-            "May":       5,
-            "June":      6,
-            "July":      7,
-            "August":    8,
-            "September": 9,
-            "October":   10,
-            "November":  11,
-            "December":  12
-        }
-
-    def __str__(self):
-        if self.dom == 0:
-            return " "
-        return str(self.dom)
-
-    def __call__(self):
-        return self.events
-
-    def toString(self):
-        return f"{self.dow}. {list(self.months.keys())[self.month-1]} {self.dom}, {self.year}"
-
-    def addEvent(self, event, time_slot):
-        self.events.append(Event(event, time_slot))
-
-
-class Event:
-    def __init__(self, event, time_slot):
-        self.event     = event
-        self.time_slot = time_slot
-
-
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    profiler.enabled = "--profile-startup" in sys.argv
+    profiler.mark("import")
+    app = QApplication([arg for arg in sys.argv if arg != "--profile-startup"])
     app.setStyle('Fusion')
+    initServices()
     ex = App()
-    sys.exit(app.exec_())
+    profiler.mark("window")
+    status = app.exec_()
+    writeQueue.wait(timeout=10)
+    if config.get("METRICS_FILE"):
+        metrics.dump(config["METRICS_FILE"])
+    sys.exit(status)
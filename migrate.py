@@ -0,0 +1,13 @@
+import argparse
+from scheduler.config import load_config
+from scheduler.storage import open_storage
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bring the database schema up to date and fill in start_ts/end_ts for older events.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows converted per transaction")
+    args = parser.parse_args()
+
+    storage = open_storage(load_config())
+    migrated = storage.migrate(args.batch_size, progress=lambda n: print(f"{n} events migrated", flush=True))
+    print(f"Done, {migrated} events migrated")
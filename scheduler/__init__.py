@@ -0,0 +1,13 @@
+from .cache import MonthCache
+from .changes import ChangeFeed, RemoteWatcher
+from .columns import EventColumns
+from .config import load_config
+from .intervals import IntervalIndex
+from .localcache import LocalCache, MirrorWatcher, open_local_cache
+from .metrics import InstrumentedStorage, Metrics
+from .model import MONTHS, Day, Event, month_days
+from .recurrence import RecurrenceRule, expand_recurrence
+from .reminders import ReminderDispatcher
+from .search import SearchIndex
+from .storage import MySQLStorage, SQLiteStorage, Storage, open_storage
+from .writebehind import WriteBehindQueue
@@ -0,0 +1,56 @@
+import heapq
+
+
+def start_of(event):
+    return event["start_ts"]
+
+
+# Pages through one window of events in start order. `fetch(after, limit)` returns the
+# next plain events after the (start_ts, id) key `after`; `extra` holds events that do not
+# come from that query (recurrence occurrences, unsaved writes) and is merged in as the
+# pages pass them, so every page is in order without loading the whole window.
+class AgendaPager:
+    def __init__(self, fetch, extra=(), page_size=200, in_memory=False):
+        self.fetch     = fetch
+        self.extra     = sorted(extra, key=start_of)
+        self.page_size = page_size
+        self.in_memory = in_memory
+        self.after     = None
+        self.exhausted = False
+
+    def has_more(self):
+        return not self.exhausted or bool(self.extra)
+
+    def next_page(self):
+        rows = [] if self.exhausted else self.fetch(self.after, self.page_size)
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        if rows:
+            self.after = (rows[-1]["start_ts"], rows[-1].get("id"))
+        if self.exhausted:
+            taken, self.extra = self.extra, []
+        else:
+            boundary = rows[-1]["start_ts"]
+            split = next((i for i, event in enumerate(self.extra) if event["start_ts"] > boundary), len(self.extra))
+            taken, self.extra = self.extra[:split], self.extra[split:]
+        return list(heapq.merge(rows, taken, key=start_of)) if taken else rows
+
+
+def storage_pager(storage, start_ts, end_ts, extra=(), page_size=200):
+    def fetch(after, limit):
+        return storage.event_page(start_ts, end_ts, after, limit)
+
+    return AgendaPager(fetch, list(storage.occurrences(start_ts, end_ts)) + list(extra), page_size)
+
+
+def columns_pager(columns, start_ts, end_ts, extra=(), page_size=200):
+    lo, hi = columns.span(start_ts, end_ts)
+    position = [lo]
+
+    def fetch(after, limit):
+        end = min(position[0] + limit, hi)
+        rows = [columns.event(i) for i in range(position[0], end)]
+        position[0] = end
+        return rows
+
+    return AgendaPager(fetch, extra, page_size, in_memory=True)
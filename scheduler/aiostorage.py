@@ -0,0 +1,212 @@
+import asyncio
+from .recurrence import expand_recurrence
+from .storage import EVENT_COLUMNS, SQLiteStorage
+from .times import DAY, month_range, to_timestamp, with_timestamps
+
+
+# The asyncio counterpart of Storage for the API service: the same queries over an async
+# connection pool, so one process can serve many clients without a thread per request.
+class AsyncStorage:
+    async def month_counts(self, year, month):
+        counts = await self.event_counts(year, month)
+        start, end = month_range(year, month)
+        for occurrence in await self.occurrences(start, end):
+            day = (occurrence["start_ts"] - start) // DAY + 1
+            counts[day] = counts.get(day, 0) + 1
+        return counts
+
+    async def day_events(self, year, month, day):
+        start = to_timestamp(year, month, day)
+        return await self.range_events(start, start + DAY)
+
+    async def range_events(self, start_ts, end_ts):
+        events, occurrences = await asyncio.gather(self.event_range(start_ts, end_ts), self.occurrences(start_ts, end_ts))
+        if occurrences:
+            events = sorted(events + occurrences, key=lambda event: event["start_ts"])
+        return events
+
+    async def occurrences(self, start_ts, end_ts):
+        recurrences = await self.recurrences_between(start_ts, end_ts)
+        if not recurrences:
+            return []
+        exceptions = {}
+        for exception in await self.recurrence_exceptions([recurrence["id"] for recurrence in recurrences]):
+            exceptions.setdefault(exception["recurrence_id"], []).append(exception)
+        return [occurrence for recurrence in recurrences
+                for occurrence in expand_recurrence(recurrence, exceptions.get(recurrence["id"], ()), start_ts, end_ts)]
+
+    async def add_events(self, events):
+        events = [with_timestamps(event) for event in events]
+        await self.insert_batch(events)
+        return len(events)
+
+    async def event_counts(self, year, month):
+        raise NotImplementedError
+
+    async def event_range(self, start_ts, end_ts):
+        raise NotImplementedError
+
+    async def recurrences_between(self, start_ts, end_ts):
+        raise NotImplementedError
+
+    async def recurrence_exceptions(self, recurrence_ids):
+        raise NotImplementedError
+
+    async def insert_batch(self, events):
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+
+class AsyncMySQLStorage(AsyncStorage):
+    def __init__(self, size=5, recycle=3600, **connect_args):
+        self.size         = size
+        self.recycle      = recycle
+        self.connect_args = connect_args
+        self.pool         = None
+        self.opening      = None
+
+    async def connect(self):
+        if self.pool is None:
+            if self.opening is None:
+                import aiomysql
+                self.opening = asyncio.ensure_future(aiomysql.create_pool(
+                    minsize=1, maxsize=self.size, pool_recycle=self.recycle, autocommit=True,
+                    cursorclass=aiomysql.DictCursor, **self.connect_args))
+            try:
+                self.pool = await asyncio.shield(self.opening)
+            except Exception:
+                self.opening = None
+                raise
+        return self.pool
+
+    async def fetchall(self, query, args=()):
+        pool = await self.connect()
+        async with pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(query, args)
+                return list(await cursor.fetchall())
+
+    async def event_counts(self, year, month):
+        start, end = month_range(year, month)
+        rows = await self.fetchall('''SELECT FLOOR((start_ts - %s) / %s) + 1 AS day, COUNT(*) AS num_events FROM `events`
+                                      WHERE start_ts >= %s AND start_ts < %s GROUP BY 1''',
+                                   (start, DAY, start, end))
+        return {int(row["day"]): row["num_events"] for row in rows}
+
+    async def event_range(self, start_ts, end_ts):
+        return await self.fetchall('''SELECT * FROM `events` WHERE start_ts >= %s AND start_ts < %s ORDER BY start_ts, id''',
+                                   (start_ts, end_ts))
+
+    async def recurrences_between(self, start_ts, end_ts):
+        return await self.fetchall('''SELECT * FROM `recurrences` WHERE start_ts < %s AND (until_ts IS NULL OR until_ts >= %s)
+                                      OR id IN (SELECT recurrence_id FROM `recurrence_exceptions`
+                                                WHERE NOT cancelled AND start_ts >= %s AND start_ts < %s)''',
+                                   (end_ts, start_ts, start_ts, end_ts))
+
+    async def recurrence_exceptions(self, recurrence_ids):
+        return await self.fetchall('''SELECT * FROM `recurrence_exceptions` WHERE recurrence_id IN %s''',
+                                   (tuple(recurrence_ids),))
+
+    async def insert_batch(self, events):
+        pool = await self.connect()
+        async with pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.executemany(f'''INSERT INTO `events` ({", ".join(EVENT_COLUMNS)})
+                                         VALUES ({", ".join(["%s"] * len(EVENT_COLUMNS))})''',
+                                         [tuple(event[column] for column in EVENT_COLUMNS) for event in events])
+            await connection.commit()
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+
+
+class AsyncSQLiteStorage(AsyncStorage):
+    def __init__(self, path, size=5):
+        self.path        = path
+        self.size        = size
+        self.idle        = asyncio.LifoQueue()
+        self.connections = []
+        self.opened      = 0
+
+    async def acquire(self):
+        if self.idle.empty() and self.opened < self.size:
+            import aiosqlite
+            if not self.opened:
+                # The synchronous storage owns the schema; let it create or upgrade the file once.
+                SQLiteStorage(self.path).connection().close()
+            self.opened += 1
+            try:
+                connection = await aiosqlite.connect(self.path, timeout=30)
+                connection.row_factory = aiosqlite.Row
+                await connection.execute("PRAGMA journal_mode=WAL")
+            except Exception:
+                self.opened -= 1
+                raise
+            self.connections.append(connection)
+            return connection
+        return await self.idle.get()
+
+    async def fetchall(self, query, args=()):
+        connection = await self.acquire()
+        try:
+            async with connection.execute(query, args) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+        finally:
+            self.idle.put_nowait(connection)
+
+    async def event_counts(self, year, month):
+        start, end = month_range(year, month)
+        rows = await self.fetchall('''SELECT (start_ts - ?) / ? + 1 AS day, COUNT(*) AS num_events FROM events
+                                      WHERE start_ts >= ? AND start_ts < ? GROUP BY 1''',
+                                   (start, DAY, start, end))
+        return {row["day"]: row["num_events"] for row in rows}
+
+    async def event_range(self, start_ts, end_ts):
+        return await self.fetchall('''SELECT * FROM events WHERE start_ts >= ? AND start_ts < ? ORDER BY start_ts, id''',
+                                   (start_ts, end_ts))
+
+    async def recurrences_between(self, start_ts, end_ts):
+        return await self.fetchall('''SELECT * FROM recurrences WHERE start_ts < ? AND (until_ts IS NULL OR until_ts >= ?)
+                                      OR id IN (SELECT recurrence_id FROM recurrence_exceptions
+                                                WHERE NOT cancelled AND start_ts >= ? AND start_ts < ?)''',
+                                   (end_ts, start_ts, start_ts, end_ts))
+
+    async def recurrence_exceptions(self, recurrence_ids):
+        return await self.fetchall(
+            f'''SELECT * FROM recurrence_exceptions WHERE recurrence_id IN ({", ".join("?" * len(recurrence_ids))})''',
+            tuple(recurrence_ids))
+
+    async def insert_batch(self, events):
+        connection = await self.acquire()
+        try:
+            await connection.executemany(
+                f'''INSERT INTO events ({", ".join(EVENT_COLUMNS)}) VALUES ({", ".join("?" * len(EVENT_COLUMNS))})''',
+                [tuple(SQLiteStorage.adapt(event[column]) for column in EVENT_COLUMNS) for event in events])
+            await connection.commit()
+        except Exception:
+            await connection.rollback()
+            raise
+        finally:
+            self.idle.put_nowait(connection)
+
+    async def close(self):
+        for connection in self.connections:
+            await connection.close()
+        self.connections, self.opened = [], 0
+
+
+def open_async_storage(config):
+    size = int(config.get("API_POOL_SIZE") or config.get("MYSQL_POOL_SIZE") or 5)
+    if (config.get("STORAGE") or "mysql").lower() == "sqlite":
+        return AsyncSQLiteStorage(config.get("SQLITE_PATH") or "scheduler.db", size)
+    return AsyncMySQLStorage(size=size,
+                             recycle=int(float(config.get("MYSQL_POOL_RECYCLE") or 3600)),
+                             host=config.get("MYSQL_HOST"),
+                             user=config.get("MYSQL_USER"),
+                             password=config.get("MYSQL_PASS"),
+                             db=config.get("MYSQL_DB"),
+                             charset='utf8mb4')
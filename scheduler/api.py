@@ -0,0 +1,251 @@
+import asyncio
+import calendar
+import json
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+from .storage import EVENT_COLUMNS
+from .times import DAY, event_from_timestamps, with_timestamps
+
+MAX_BODY  = 8 * 1024 * 1024
+MAX_RANGE = 366 * DAY
+REASONS   = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+             413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Concurrent identical reads share one query instead of each taking a pool connection.
+class Coalescer:
+    def __init__(self):
+        self.inflight = {}
+
+    async def run(self, key, factory):
+        task = self.inflight.get(key)
+        if task is None:
+            task = self.inflight[key] = asyncio.ensure_future(factory())
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+
+# Inserts from concurrent requests are held for `linger` seconds (or until `batch_size`
+# events are waiting) and written with one executemany, the async twin of WriteBehindQueue.
+class InsertBatcher:
+    def __init__(self, storage, batch_size=500, linger=0.01):
+        self.storage    = storage
+        self.batch_size = batch_size
+        self.linger     = linger
+        self.pending    = []
+        self.size       = 0
+        self.timer      = None
+        self.flushing   = set()
+
+    async def add(self, events):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((events, future))
+        self.size += len(events)
+        if self.size >= self.batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.linger, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending, self.size = self.pending, [], 0
+        if batch:
+            task = asyncio.ensure_future(self.write(batch))
+            self.flushing.add(task)
+            task.add_done_callback(self.flushing.discard)
+
+    async def write(self, batch):
+        try:
+            await self.storage.add_events([event for events, _ in batch for event in events])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for events, future in batch:
+            if not future.done():
+                future.set_result(len(events))
+
+    async def drain(self):
+        self.flush()
+        if self.flushing:
+            await asyncio.gather(*self.flushing, return_exceptions=True)
+
+
+def as_event(body):
+    if not isinstance(body, dict) or not body.get("event_name"):
+        raise ApiError(400, "an event needs an event_name")
+    try:
+        if "start_hour" in body:
+            event = with_timestamps({"date_passed": False, "date_set": datetime.utcnow(), **body})
+        else:
+            event = event_from_timestamps(body["event_name"], int(body["start_ts"]), int(body.get("end_ts", body["start_ts"])))
+    except (KeyError, TypeError, ValueError):
+        raise ApiError(400, "an event needs start_ts (and optionally end_ts), or the day and start/end time fields")
+    return {column: event.get(column) for column in EVENT_COLUMNS}
+
+
+class ApiService:
+    def __init__(self, storage, batch_size=500, linger=0.01):
+        self.storage   = storage
+        self.reads     = Coalescer()
+        self.inserts   = InsertBatcher(storage, batch_size, linger)
+        self.methods   = {"month_counts": self.month_counts,
+                          "day_events":   self.day_events,
+                          "range_events": self.range_events,
+                          "add_events":   self.add_events}
+
+    @staticmethod
+    def integers(params, *names):
+        try:
+            return [int(params[name]) for name in names]
+        except KeyError as e:
+            raise ApiError(400, f"missing parameter {e.args[0]}")
+        except (TypeError, ValueError):
+            raise ApiError(400, f"{', '.join(names)} must be integers")
+
+    async def month_counts(self, params):
+        year, month = self.integers(params, "year", "month")
+        if not 1 <= month <= 12:
+            raise ApiError(400, "month must be between 1 and 12")
+        counts = await self.reads.run(("month_counts", year, month), lambda: self.storage.month_counts(year, month))
+        return {"year": year, "month": month, "counts": {str(day): count for day, count in sorted(counts.items())}}
+
+    async def day_events(self, params):
+        year, month, day = self.integers(params, "year", "month", "day")
+        if not 1 <= month <= 12 or not 1 <= day <= calendar.monthrange(year, month)[1]:
+            raise ApiError(400, "not a valid date")
+        return {"events": await self.reads.run(("day_events", year, month, day),
+                                               lambda: self.storage.day_events(year, month, day))}
+
+    async def range_events(self, params):
+        start_ts, end_ts = self.integers(params, "start", "end")
+        if end_ts < start_ts:
+            raise ApiError(400, "end must not be before start")
+        if end_ts - start_ts > MAX_RANGE:
+            raise ApiError(400, f"a range can span at most {MAX_RANGE // DAY} days")
+        return {"events": await self.reads.run(("range_events", start_ts, end_ts),
+                                               lambda: self.storage.range_events(start_ts, end_ts))}
+
+    async def add_events(self, params):
+        events = params.get("events", params) if isinstance(params, dict) else params
+        events = [as_event(event) for event in (events if isinstance(events, list) else [events])]
+        return {"added": await self.inserts.add(events) if events else 0}
+
+    async def call(self, method, params):
+        if method not in self.methods:
+            raise ApiError(404, f"unknown method {method}")
+        if not isinstance(params, dict):
+            raise ApiError(400, "params must be an object")
+        return await self.methods[method](params)
+
+    # A batch runs its calls concurrently, so its reads share the pool and its inserts
+    # land in the same write; each call succeeds or fails on its own.
+    async def batch(self, calls):
+        if not isinstance(calls, list):
+            raise ApiError(400, "a batch is a list of {method, params} objects")
+
+        async def one(call):
+            try:
+                if not isinstance(call, dict):
+                    raise ApiError(400, "a batch entry must be an object")
+                return {"result": await self.call(call.get("method"), call.get("params") or {})}
+            except ApiError as e:
+                return {"error": str(e), "status": e.status}
+            except Exception as e:
+                print(e)
+                return {"error": str(e), "status": 500}
+
+        return await asyncio.gather(*(one(call) for call in calls))
+
+    def route(self, method, path, query, body):
+        parts = [part for part in path.split("/") if part]
+        if method == "GET" and len(parts) == 3 and parts[0] == "months":
+            return self.month_counts({"year": parts[1], "month": parts[2]})
+        if method == "GET" and len(parts) == 4 and parts[0] == "days":
+            return self.day_events({"year": parts[1], "month": parts[2], "day": parts[3]})
+        if parts == ["events"]:
+            if method == "GET":
+                return self.range_events({name: values[-1] for name, values in query.items()})
+            if method == "POST":
+                return self.add_events(body)
+            raise ApiError(405, "use GET or POST")
+        if parts == ["batch"]:
+            if method != "POST":
+                raise ApiError(405, "use POST")
+            return self.batch(body)
+        raise ApiError(404, f"no route for {method} {path}")
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    return
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {"error": "request body too large"}, False)
+                    return
+                raw = await reader.readexactly(length) if length else b""
+                status, payload = await self.dispatch(method, target, raw)
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            return
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, raw):
+        url = urlsplit(target)
+        try:
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                raise ApiError(400, "body is not valid JSON")
+            return 200, await self.route(method, url.path, parse_qs(url.query), body)
+        except ApiError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            print(e)
+            return 500, {"error": "internal error"}
+
+    @staticmethod
+    async def respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload, default=str).encode()
+        writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body)
+        await writer.drain()
+
+
+async def serve(storage, host="127.0.0.1", port=8080, batch_size=500, linger=0.01, backlog=1024, ready=None):
+    service = ApiService(storage, batch_size, linger)
+    server = await asyncio.start_server(service.handle, host, port, backlog=backlog)
+    if ready is not None:
+        ready(server)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.inserts.drain()
+        await storage.close()
@@ -0,0 +1,71 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+class MonthCache:
+    def __init__(self, max_bytes=1048576):
+        self.max_bytes = max_bytes
+        self.bytes     = 0
+        self.entries   = OrderedDict()
+        self.versions  = {}
+        self.cleared   = 0
+        self.lock      = threading.Lock()
+
+    @staticmethod
+    def sizeof(value):
+        if hasattr(value, "nbytes"):
+            return value.nbytes()
+        return sys.getsizeof(value) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+
+    def version(self, key):
+        with self.lock:
+            return self.cleared, self.versions.get(key, 0)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def put(self, key, value, version=None):
+        size = self.sizeof(value)
+        with self.lock:
+            if version is not None and version != (self.cleared, self.versions.get(key, 0)):
+                return False
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            if size > self.max_bytes:
+                return False
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self.bytes -= self.entries.popitem(last=False)[1][1]
+            return True
+
+    def invalidate(self, key):
+        with self.lock:
+            self.versions[key] = self.versions.get(key, 0) + 1
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+
+    def update_day(self, key, dom, count):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            value = dict(entry[0])
+            value[dom] = count
+            self.entries[key] = (value, entry[1])
+
+    def clear(self):
+        with self.lock:
+            self.cleared += 1
+            self.entries.clear()
+            self.bytes = 0
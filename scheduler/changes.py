@@ -0,0 +1,86 @@
+import threading
+import time
+from .times import DAY, ts_date
+
+
+def months_of(events):
+    return {tuple(ts_date(event["start_ts"])[:2]) for event in events}
+
+
+class ChangeFeed:
+    def __init__(self):
+        self.listeners = []
+
+    def subscribe(self, callback, on_series=None):
+        self.listeners.append((callback, on_series))
+
+    def publish(self, events):
+        events = list(events)
+        if events:
+            for callback, _ in self.listeners:
+                callback(events)
+
+    def publish_all(self):
+        for callback, _ in self.listeners:
+            callback(None)
+
+    # A new series can land on any visible day, so listeners that can't take it
+    # as a whole get a full refresh instead.
+    def publish_series(self, recurrence):
+        for callback, on_series in self.listeners:
+            if on_series is not None:
+                on_series(recurrence)
+            else:
+                callback(None)
+
+
+class RemoteWatcher:
+    def __init__(self, storage, feed, interval=15, batch_size=1000, retention=7 * DAY):
+        self.storage    = storage
+        self.feed       = feed
+        self.interval   = interval
+        self.batch_size = batch_size
+        self.retention  = retention
+        self.cursor     = None
+        self.stopped    = threading.Event()
+        self.thread     = None
+
+    def start(self):
+        if self.interval > 0 and self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="remote-watcher", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def poll(self):
+        if self.cursor is None:
+            self.storage.prune_changes(time.time() - self.retention)
+            self.cursor = self.storage.max_change_id()
+            return
+        while True:
+            changes = self.storage.changes_after(self.cursor, self.batch_size)
+            if not changes:
+                return
+            self.cursor = changes[-1]["id"]
+            self.apply(changes)
+            if len(changes) < self.batch_size:
+                return
+
+    # New and edited events are fetched and published as rows; anything that can move or
+    # remove what is already on screen (deletes, edits, recurrence changes) forces a full refresh.
+    def apply(self, changes):
+        ids = {change["row_id"] for change in changes
+               if change["table_name"] == "events" and change["action"] != "delete"}
+        if ids:
+            self.feed.publish(self.storage.events_by_ids(sorted(ids)))
+        if any(change["table_name"] != "events" or change["action"] != "insert" for change in changes):
+            self.feed.publish_all()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(e)
+            self.stopped.wait(self.interval)
@@ -0,0 +1,56 @@
+import sys
+from array import array
+from bisect import bisect_left
+
+NONE = -1
+
+
+# A day's events as parallel arrays sorted by start, so a loaded event costs
+# a few machine words instead of a dict. Instances are never mutated once built.
+class EventColumns:
+    __slots__ = ("starts", "ends", "ids", "recurrence_ids", "occurrence_ts", "names")
+
+    def __init__(self):
+        self.starts         = array("q")
+        self.ends           = array("q")
+        self.ids            = array("q")
+        self.recurrence_ids = array("q")
+        self.occurrence_ts  = array("q")
+        self.names          = []
+
+    @classmethod
+    def from_events(cls, events):
+        columns = cls()
+        for event in sorted(events, key=lambda event: event["start_ts"]):
+            columns.append(event)
+        return columns
+
+    def append(self, event):
+        self.starts.append(event["start_ts"])
+        self.ends.append(event["end_ts"])
+        self.ids.append(NONE if event.get("id") is None else event["id"])
+        self.recurrence_ids.append(NONE if event.get("recurrence_id") is None else event["recurrence_id"])
+        self.occurrence_ts.append(NONE if event.get("occurrence_ts") is None else event["occurrence_ts"])
+        self.names.append(sys.intern(event["event_name"]))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def nbytes(self):
+        arrays = (self.starts, self.ends, self.ids, self.recurrence_ids, self.occurrence_ts)
+        return (sum(sys.getsizeof(column) for column in arrays) + sys.getsizeof(self.names)
+                + sum(sys.getsizeof(name) for name in set(self.names)))
+
+    def event(self, i):
+        event = {"id":         None if self.ids[i] == NONE else self.ids[i],
+                 "event_name": self.names[i],
+                 "start_ts":   self.starts[i],
+                 "end_ts":     self.ends[i]}
+        if self.recurrence_ids[i] != NONE:
+            event["recurrence_id"] = self.recurrence_ids[i]
+            event["occurrence_ts"] = self.occurrence_ts[i]
+        return event
+
+    def span(self, start_ts, end_ts):
+        return bisect_left(self.starts, start_ts), bisect_left(self.starts, end_ts)
+
@@ -0,0 +1,3 @@
+def load_config(path=".env"):
+    from dotenv import dotenv_values
+    return dotenv_values(path)
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+from .times import DAY
+
+SLOT  = 300
+SLOTS = DAY // SLOT
+
+
+def span_mask(lo, hi):
+    return ((1 << (hi - lo)) - 1) << lo if hi > lo else 0
+
+
+# Bit i of a day's bitmap covers the five minutes starting at i * SLOT seconds past midnight.
+def day_bitmaps(spans, start_ts, days):
+    bitmaps = [0] * days
+    end_ts = start_ts + days * DAY
+    for span_start, span_end in spans:
+        span_start, span_end = max(span_start, start_ts), min(max(span_end, span_start + 1), end_ts)
+        while span_start < span_end:
+            day, offset = divmod(span_start - start_ts, DAY)
+            last = min(span_end - start_ts - day * DAY, DAY)
+            lo, hi = offset // SLOT, -(-last // SLOT)
+            bitmaps[day] |= ((1 << (hi - lo)) - 1) << lo
+            span_start = start_ts + (day + 1) * DAY
+    return bitmaps
+
+
+def busy_bitmaps(calendars, start_ts, days):
+    def load(calendar):
+        return day_bitmaps(calendar.busy_spans(start_ts, start_ts + days * DAY), start_ts, days)
+
+    busy = [0] * days
+    with ThreadPoolExecutor(max_workers=min(8, len(calendars) or 1)) as pool:
+        for bitmaps in pool.map(load, calendars):
+            busy = [a | b for a, b in zip(busy, bitmaps)]
+    return busy
+
+
+# Bit i of the result is set when bits i .. i + length - 1 are all set, found with
+# O(log length) shift-and steps instead of scanning bit by bit.
+def runs_of(bitmap, length):
+    covered = 1
+    while covered < length:
+        shift = min(covered, length - covered)
+        bitmap &= bitmap >> shift
+        covered += shift
+    return bitmap
+
+
+# Slots starting before `not_before` (usually now) are never offered.
+def free_slots(busy, start_ts, minutes, count=10, day_start=0, day_end=SLOTS, not_before=None):
+    length = max(1, -(-minutes * 60 // SLOT))
+    allowed = span_mask(day_start, day_end)
+    slots = []
+    for day, bitmap in enumerate(busy):
+        free = ~bitmap & allowed
+        if not_before is not None and not_before > start_ts + day * DAY:
+            free &= ~span_mask(0, min(-(-(not_before - start_ts - day * DAY) // SLOT), SLOTS))
+        starts = runs_of(free, length)
+        while starts and len(slots) < count:
+            lowest = starts & -starts
+            i = lowest.bit_length() - 1
+            slot_start = start_ts + day * DAY + i * SLOT
+            slots.append((slot_start, slot_start + length * SLOT))
+            starts &= ~((1 << (i + length)) - 1)
+        if len(slots) >= count:
+            break
+    return slots
+
+
+def find_free_time(calendars, start_ts, days, minutes, count=10, day_start=0, day_end=SLOTS, not_before=None):
+    return free_slots(busy_bitmaps(calendars, start_ts, days), start_ts, minutes, count, day_start, day_end, not_before)
@@ -0,0 +1,16 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def bin_days(days, weights, length):
+    if numpy is not None:
+        counts = numpy.bincount(numpy.asarray(days, dtype=numpy.int64),
+                                weights=numpy.asarray(weights, dtype=numpy.int64), minlength=length)
+        return counts[:length].astype(numpy.int64).tolist()
+    counts = [0] * length
+    for day, weight in zip(days, weights):
+        if 0 <= day < length:
+            counts[day] += weight
+    return counts
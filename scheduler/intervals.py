@@ -0,0 +1,43 @@
+class IntervalIndex:
+    def __init__(self, intervals=()):
+        self.entries = sorted(((start, max(end, start + 1), item) for start, end, item in intervals),
+                              key=lambda entry: entry[0])
+        self.build()
+
+    @classmethod
+    def from_events(cls, events):
+        return cls((event["start_ts"], event["end_ts"], event) for event in events)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def build(self):
+        self.max_end = [0] * len(self.entries)
+        self.build_range(0, len(self.entries))
+
+    # The sorted entries form an implicit balanced tree rooted at each range's midpoint;
+    # max_end[mid] holds the largest end in that subtree so queries can skip whole branches.
+    def build_range(self, lo, hi):
+        if lo >= hi:
+            return 0
+        mid = (lo + hi) // 2
+        self.max_end[mid] = max(self.entries[mid][1], self.build_range(lo, mid), self.build_range(mid + 1, hi))
+        return self.max_end[mid]
+
+    def overlapping(self, start, end):
+        found = []
+        self.query(0, len(self.entries), start, max(end, start + 1), found)
+        return found
+
+    def query(self, lo, hi, start, end, found):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self.max_end[mid] <= start:
+            return
+        self.query(lo, mid, start, end, found)
+        entry = self.entries[mid]
+        if entry[0] < end:
+            if entry[1] > start:
+                found.append(entry[2])
+            self.query(mid + 1, hi, start, end, found)
@@ -0,0 +1,324 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+from .changes import RemoteWatcher
+from .storage import EVENT_COLUMNS, EXCEPTION_COLUMNS, RECURRENCE_COLUMNS, SQLiteStorage, batched
+from .times import with_timestamps
+
+
+def user_data_dir(name="scheduler"):
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    path = os.path.join(base, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def open_local_cache(config):
+    if (config.get("STORAGE") or "mysql").lower() == "sqlite" or config.get("LOCAL_CACHE") == "0":
+        return None
+    path = config.get("LOCAL_CACHE_PATH")
+    if not path:
+        # One file per server and database, so switching servers never mixes mirrors.
+        source = f"{config.get('MYSQL_HOST')}/{config.get('MYSQL_DB')}"
+        path = os.path.join(user_data_dir(), f"cache-{hashlib.sha1(source.encode()).hexdigest()[:12]}.db")
+    return LocalCache(path)
+
+
+# A SQLite mirror of the server that the app reads from and writes to. Rows copied from
+# the server keep their server ids; rows written locally get the negated id of their
+# outbox entry until the entry has been replayed and the server's copy pulled back.
+class LocalCache(SQLiteStorage):
+    CACHE_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id      INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind    TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            pushed  INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value TEXT
+        );
+    '''
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.on_outbox = []
+
+    def prepare(self, connection):
+        super().prepare(connection)
+        connection.executescript(self.CACHE_SCHEMA)
+
+    def triggers(self):
+        return ""
+
+    def get_meta(self, key):
+        row = self.connection().execute('''SELECT value FROM meta WHERE key = ?''', (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set_meta(self, key, value):
+        connection = self.connection()
+        with connection:
+            connection.execute('''INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)''', (key, json.dumps(value)))
+
+    def enqueue(self, connection, kind, payload):
+        return connection.execute('''INSERT INTO outbox (kind, payload) VALUES (?, ?)''',
+                                  (kind, json.dumps(payload, default=self.adapt))).lastrowid
+
+    def notify(self):
+        for callback in self.on_outbox:
+            callback()
+
+    def add_event(self, event):
+        self.insert_batch([with_timestamps(event)])
+        return None
+
+    def insert_batch(self, events):
+        connection = self.connection()
+        with connection:
+            for event in events:
+                outbox_id = self.enqueue(connection, "event", event)
+                connection.execute(
+                    f'''INSERT INTO events (id, {", ".join(EVENT_COLUMNS)}) VALUES (?, {", ".join("?" * len(EVENT_COLUMNS))})''',
+                    (-outbox_id, *(self.adapt(event[column]) for column in EVENT_COLUMNS)))
+        self.notify()
+
+    def add_recurrence(self, recurrence):
+        recurrence = self.with_until(recurrence)
+        connection = self.connection()
+        with connection:
+            outbox_id = self.enqueue(connection, "recurrence", recurrence)
+            connection.execute(
+                f'''INSERT INTO recurrences (id, {", ".join(RECURRENCE_COLUMNS)})
+                   VALUES (?, {", ".join("?" * len(RECURRENCE_COLUMNS))})''',
+                (-outbox_id, *(self.adapt(recurrence[column]) for column in RECURRENCE_COLUMNS)))
+        self.notify()
+        return -outbox_id
+
+    def add_exception(self, exception):
+        connection = self.connection()
+        with connection:
+            self.enqueue(connection, "exception", exception)
+            connection.execute(
+                f'''INSERT OR REPLACE INTO recurrence_exceptions ({", ".join(EXCEPTION_COLUMNS)})
+                   VALUES ({", ".join("?" * len(EXCEPTION_COLUMNS))})''',
+                tuple(exception.get(column) for column in EXCEPTION_COLUMNS))
+        self.notify()
+
+    def mark_passed(self, until_ts):
+        connection = self.connection()
+        with connection:
+            cursor = connection.execute(
+                '''UPDATE events SET date_passed = 1 WHERE start_ts <= ? AND date_passed = 0''', (until_ts,))
+            if cursor.rowcount:
+                self.enqueue(connection, "passed", {"until_ts": until_ts})
+        return cursor.rowcount
+
+    def outbox(self, limit=1000):
+        rows = self.connection().execute(
+            '''SELECT id, kind, payload FROM outbox WHERE pushed = 0 ORDER BY id LIMIT ?''', (limit,))
+        return [(row["id"], row["kind"], json.loads(row["payload"])) for row in rows]
+
+    def outbox_size(self):
+        return self.connection().execute('''SELECT COUNT(*) FROM outbox''').fetchone()[0]
+
+    def mark_pushed(self, outbox_ids):
+        connection = self.connection()
+        with connection:
+            connection.executemany('''UPDATE outbox SET pushed = 1 WHERE id = ?''', [(i,) for i in outbox_ids])
+
+    # Runs in the same transaction as the pulled rows and only drops a replayed row once
+    # its server copy is among them, so it is never missing or shown twice. Pulled events
+    # are matched by name and time; recurrences by the server id recorded when pushed.
+    def settle_pushed(self, connection, rows, recurrences):
+        if rows and connection.execute('''SELECT 1 FROM outbox WHERE pushed = 1 AND kind = 'event' LIMIT 1''').fetchone():
+            for row in rows:
+                local = connection.execute(
+                    '''SELECT events.id FROM events JOIN outbox ON outbox.id = -events.id
+                       WHERE outbox.pushed = 1 AND events.event_name = ? AND events.start_ts IS ? AND events.end_ts IS ?
+                       LIMIT 1''', (row["event_name"], row["start_ts"], row["end_ts"])).fetchone()
+                if local is not None:
+                    connection.execute('''DELETE FROM events WHERE id = ?''', (local[0],))
+                    connection.execute('''DELETE FROM outbox WHERE id = ?''', (-local[0],))
+        if recurrences is not None:
+            server_ids = self.get_meta("recurrence ids") or {}
+            pulled = {row["id"] for row in recurrences}
+            settled = [(-row[0],) for row in connection.execute('''SELECT id FROM outbox WHERE pushed = 1 AND kind = 'recurrence' ''')
+                       if server_ids.get(str(-row[0])) in pulled]
+            connection.executemany('''DELETE FROM recurrences WHERE id = ?''', settled)
+            connection.executemany('''DELETE FROM recurrence_exceptions WHERE recurrence_id = ?''', settled)
+            connection.executemany('''DELETE FROM outbox WHERE id = -?''', settled)
+        # Exceptions and passed marks have no local row of their own to replace.
+        connection.execute('''DELETE FROM outbox WHERE pushed = 1 AND kind IN ('exception', 'passed')''')
+
+    def apply_remote(self, rows=(), deleted=(), recurrences=None, exceptions=None, cursor=None, reset=False):
+        connection = self.connection()
+        with connection:
+            if reset:
+                connection.execute('''DELETE FROM events WHERE id > 0''')
+            self.settle_pushed(connection, rows, recurrences)
+            if deleted:
+                connection.executemany('''DELETE FROM events WHERE id = ?''', [(i,) for i in deleted])
+            columns = ("id",) + EVENT_COLUMNS
+            connection.executemany(
+                f'''INSERT OR REPLACE INTO events ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})''',
+                [tuple(self.adapt(row.get(column)) for column in columns) for row in rows])
+            if recurrences is not None:
+                connection.execute('''DELETE FROM recurrences WHERE id > 0''')
+                connection.execute('''DELETE FROM recurrence_exceptions WHERE recurrence_id > 0''')
+                columns = ("id",) + RECURRENCE_COLUMNS
+                connection.executemany(
+                    f'''INSERT INTO recurrences ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})''',
+                    [tuple(self.adapt(row.get(column)) for column in columns) for row in recurrences])
+                connection.executemany(
+                    f'''INSERT OR REPLACE INTO recurrence_exceptions ({", ".join(EXCEPTION_COLUMNS)})
+                       VALUES ({", ".join("?" * len(EXCEPTION_COLUMNS))})''',
+                    [tuple(row.get(column) for column in EXCEPTION_COLUMNS) for row in exceptions])
+            if cursor is not None:
+                connection.execute('''INSERT OR REPLACE INTO meta (key, value) VALUES ('cursor', ?)''', (json.dumps(cursor),))
+
+
+# Keeps a LocalCache in step with the server: replays the outbox, then pulls the
+# server's change log into the mirror and publishes what changed.
+class MirrorWatcher(RemoteWatcher):
+    def __init__(self, remote, local, feed, interval=15, batch_size=1000, max_backoff=300):
+        super().__init__(remote, feed, interval, batch_size)
+        self.local       = local
+        self.max_backoff = max_backoff
+        self.online      = None
+        self.logged      = None
+        self.failures    = 0
+        self.wake        = threading.Event()
+        self.on_status   = []
+        local.on_outbox.append(self.wake.set)
+
+    def poll(self):
+        try:
+            self.push()
+            self.pull()
+        except Exception:
+            self.failures += 1
+            self.report(False)
+            raise
+        self.failures = 0
+        self.report(True)
+
+    def report(self, online):
+        self.online = online
+        queued = self.local.outbox_size()
+        for callback in self.on_status:
+            callback(online, queued)
+
+    def push(self):
+        recurrence_ids = self.local.get_meta("recurrence ids") or {}
+        while True:
+            entries = self.local.outbox(self.batch_size)
+            if not entries:
+                return
+            # Events go up as one batch; everything else is sent one call at a time and
+            # marked as soon as it lands, so a failure mid-group never re-sends a series.
+            for kind, group in self.grouped(entries):
+                if kind == "event":
+                    self.storage.insert_batch([with_timestamps(payload) for _, payload in group])
+                    self.local.mark_pushed([outbox_id for outbox_id, _ in group])
+                    continue
+                for outbox_id, payload in group:
+                    if kind == "recurrence":
+                        if str(-outbox_id) not in recurrence_ids:
+                            recurrence_ids[str(-outbox_id)] = self.storage.add_recurrence(payload)
+                            self.local.set_meta("recurrence ids", recurrence_ids)
+                    elif kind == "exception":
+                        recurrence_id = payload["recurrence_id"]
+                        if recurrence_id < 0:
+                            recurrence_id = recurrence_ids[str(recurrence_id)]
+                        self.storage.add_exception(dict(payload, recurrence_id=recurrence_id))
+                    elif kind == "passed":
+                        self.storage.mark_passed(payload["until_ts"])
+                    self.local.mark_pushed([outbox_id])
+
+    @staticmethod
+    def grouped(entries):
+        group, kind = [], None
+        for outbox_id, entry_kind, payload in entries:
+            if entry_kind != kind and group:
+                yield kind, group
+                group = []
+            kind = entry_kind
+            group.append((outbox_id, payload))
+        if group:
+            yield kind, group
+
+    # Without the server's change log there are no deltas to pull, so every poll falls
+    # back to a full snapshot until the migration has added the triggers.
+    def pull(self):
+        if self.logged is None:
+            self.logged = self.storage.has_change_log()
+            if not self.logged:
+                print("The server has no change log; run the migration so the local cache can sync changes")
+        if self.cursor is None and self.logged:
+            self.cursor = self.local.get_meta("cursor")
+        if self.cursor is None or self.behind(self.cursor):
+            self.snapshot()
+            return
+        while True:
+            changes = self.storage.changes_after(self.cursor, self.batch_size)
+            if not changes:
+                self.local.apply_remote()
+                return
+            self.cursor = changes[-1]["id"]
+            self.apply(changes)
+            if len(changes) < self.batch_size:
+                return
+
+    # A cursor saved before the server pruned past it has missed changes for good.
+    def behind(self, cursor):
+        oldest = self.storage.min_change_id()
+        return oldest is not None and oldest > cursor + 1
+
+    # The mirror never prunes the change log: another client's saved cursor may still
+    # need those rows, and one that falls behind anyway starts over from a snapshot.
+    def snapshot(self):
+        cursor = self.storage.max_change_id() if self.logged else None
+        reset = True
+        for rows in batched(self.storage.iter_events(), self.batch_size):
+            self.local.apply_remote(rows, reset=reset)
+            reset = False
+        recurrences, exceptions = self.remote_recurrences()
+        self.local.apply_remote(recurrences=recurrences, exceptions=exceptions, cursor=cursor, reset=reset)
+        self.cursor = cursor
+        self.feed.publish_all()
+
+    def remote_recurrences(self):
+        recurrences = self.storage.recurrences_between(-2 ** 62, 2 ** 62)
+        exceptions = self.storage.recurrence_exceptions([row["id"] for row in recurrences]) if recurrences else []
+        return recurrences, exceptions
+
+    def apply(self, changes):
+        ids = {change["row_id"] for change in changes if change["table_name"] == "events" and change["action"] != "delete"}
+        deleted = {change["row_id"] for change in changes if change["table_name"] == "events" and change["action"] == "delete"}
+        rows = self.storage.events_by_ids(sorted(ids)) if ids else []
+        recurrences = exceptions = None
+        if any(change["table_name"] != "events" for change in changes):
+            recurrences, exceptions = self.remote_recurrences()
+        self.local.apply_remote(rows, deleted, recurrences, exceptions, cursor=self.cursor)
+        if rows:
+            self.feed.publish(rows)
+        if any(change["table_name"] != "events" or change["action"] != "insert" for change in changes):
+            self.feed.publish_all()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(e)
+            delay = self.interval if not self.failures else min(self.interval * 2 ** self.failures, self.max_backoff)
+            self.wake.wait(delay)
+            self.wake.clear()
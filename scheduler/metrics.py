@@ -0,0 +1,132 @@
+import inspect
+import json
+import threading
+import time
+import types
+from bisect import bisect_left
+from .storage import Storage
+
+# Upper bounds of the latency buckets, in milliseconds.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count  = 0
+        self.total  = 0.0
+        self.max    = 0.0
+        self.rows   = 0
+
+    def add(self, ms, rows=0):
+        self.counts[bisect_left(BUCKETS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.rows += rows
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= fraction * self.count:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {"count": self.count,
+                "rows": self.rows,
+                "mean_ms": self.total / self.count if self.count else 0.0,
+                "p50_ms": self.percentile(0.5),
+                "p99_ms": self.percentile(0.99),
+                "max_ms": self.max}
+
+
+class Metrics:
+    def __init__(self):
+        self.histograms = {}
+        self.lock       = threading.Lock()
+
+    def record(self, name, ms, rows=0):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(ms, rows)
+
+    def snapshot(self):
+        with self.lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def totals(self, prefix):
+        with self.lock:
+            histograms = [h for name, h in self.histograms.items() if name.startswith(prefix)]
+            merged = Histogram()
+            for histogram in histograms:
+                merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                merged.count += histogram.count
+                merged.total += histogram.total
+                merged.max = max(merged.max, histogram.max)
+                merged.rows += histogram.rows
+            return merged.summary()
+
+    def dump(self, path):
+        line = json.dumps({"ts": time.time(), "metrics": self.snapshot()})
+        with open(path, "a") as f:
+            f.write(line + "\n")
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+
+def row_count(result):
+    if isinstance(result, (list, tuple, dict, set)):
+        return len(result)
+    return 0 if result is None else 1
+
+
+def composite(storage, name):
+    method = inspect.getattr_static(Storage, name, None)
+    return isinstance(method, types.FunctionType) and getattr(type(storage), name, None) is method
+
+
+# Times every call on the wrapped Storage under "<prefix>.<method>". Methods the Storage
+# base class builds out of other calls (month_counts, range_events, occurrences...) run
+# against this wrapper instead, so each query they issue is timed and counted on its own.
+class InstrumentedStorage:
+    def __init__(self, storage, metrics, prefix="db"):
+        self.storage = storage
+        self.metrics = metrics
+        self.prefix  = prefix
+
+    def __getattr__(self, name):
+        if composite(self.storage, name):
+            return types.MethodType(getattr(Storage, name), self)
+        attr = getattr(self.storage, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception:
+                self.metrics.record(f"{self.prefix}.{name}.error", (time.perf_counter() - started) * 1000)
+                raise
+            if isinstance(result, types.GeneratorType):
+                return self.stream(name, result, started)
+            self.metrics.record(f"{self.prefix}.{name}", (time.perf_counter() - started) * 1000, row_count(result))
+            return result
+        return call
+
+    def stream(self, name, rows, started):
+        count = 0
+        try:
+            for row in rows:
+                count += 1
+                yield row
+        finally:
+            self.metrics.record(f"{self.prefix}.{name}", (time.perf_counter() - started) * 1000, count)
@@ -0,0 +1,63 @@
+import calendar
+
+JAN = 1
+FEB = 2
+MAR = 3
+APR = 4
+MAY = 5
+JUN = 6
+JUL = 7
+AUG = 8
+SEP = 9
+OCT = 10
+NOV = 11
+DEC = 12
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+MONTHS = ("January", "February", "March", "April", "May", "June",
+          "July", "August", "September", "October", "November", "December")
+
+MONTH_NUMBERS = {name: number for number, name in enumerate(MONTHS, 1)}
+
+cal = calendar.Calendar()
+
+
+def month_days(year, month):
+    return [[Day(month, year, dom, WEEKDAYS[j]) for j, dom in enumerate(week)]
+            for week in cal.monthdayscalendar(year, month)]
+
+
+class Day:
+    __slots__ = ("month", "year", "dom", "dow", "events")
+
+    def __init__(self, month, year, dom, dow):
+        self.month  = month
+        self.year   = year
+        self.dom    = dom
+        self.dow    = dow
+        self.events = None
+
+    def __str__(self):
+        if self.dom == 0:
+            return " "
+        return str(self.dom)
+
+    def __call__(self):
+        return self.events or []
+
+    def toString(self):
+        return f"{self.dow}. {MONTHS[self.month - 1]} {self.dom}, {self.year}"
+
+    def addEvent(self, event, time_slot):
+        if self.events is None:
+            self.events = []
+        self.events.append(Event(event, time_slot))
+
+
+class Event:
+    __slots__ = ("event", "time_slot")
+
+    def __init__(self, event, time_slot):
+        self.event     = event
+        self.time_slot = time_slot
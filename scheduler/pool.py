@@ -0,0 +1,76 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    def __init__(self, size=5, timeout=10, ping_interval=30, recycle=3600, **connect_args):
+        self.size          = size
+        self.timeout       = timeout
+        self.ping_interval = ping_interval
+        self.recycle       = recycle
+        self.connect_args  = connect_args
+        self.idle          = queue.LifoQueue()
+        self.slots         = threading.BoundedSemaphore(size)
+
+    def _open(self):
+        from pymysql import connect
+        now = time.monotonic()
+        return [connect(**self.connect_args), now, now]
+
+    def _checkout(self):
+        try:
+            entry = self.idle.get_nowait()
+        except queue.Empty:
+            return self._open()
+
+        connection, created, last_used = entry
+        now = time.monotonic()
+        if not connection.open or now - created > self.recycle:
+            self._discard(connection)
+            return self._open()
+        if now - last_used > self.ping_interval:
+            try:
+                connection.ping(reconnect=True)
+            except Exception:
+                self._discard(connection)
+                return self._open()
+        return entry
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No database connection available after {self.timeout}s")
+        entry = None
+        try:
+            entry = self._checkout()
+            try:
+                yield entry[0]
+            except Exception:
+                try:
+                    entry[0].rollback()
+                except Exception:
+                    self._discard(entry[0])
+                    entry = None
+                raise
+        finally:
+            if entry is not None:
+                entry[2] = time.monotonic()
+                self.idle.put(entry)
+            self.slots.release()
+
+    def close(self):
+        while True:
+            try:
+                connection = self.idle.get_nowait()[0]
+            except queue.Empty:
+                return
+            self._discard(connection)
@@ -0,0 +1,133 @@
+import calendar
+import time
+from .times import DAY, add_months, to_timestamp, ts_date, ts_weekday
+
+
+WEEKDAY_CODES = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+FREQUENCIES   = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+
+
+class RecurrenceRule:
+    def __init__(self, freq, interval=1, count=None, until=None, byday=()):
+        if freq not in FREQUENCIES:
+            raise ValueError(f"Unsupported recurrence frequency: {freq}")
+        self.freq     = freq
+        self.interval = max(int(interval), 1)
+        self.count    = count
+        self.until    = until
+        self.byday    = tuple(sorted(set(byday)))
+
+    @classmethod
+    def parse(cls, text):
+        parts = dict(part.split("=", 1) for part in text.upper().removeprefix("RRULE:").split(";") if part)
+        until = parts.get("UNTIL")
+        if until is not None:
+            until = calendar.timegm(time.strptime(until.rstrip("Z").ljust(15, "0")[:15], "%Y%m%dT%H%M%S"))
+        return cls(parts.get("FREQ"),
+                   interval=parts.get("INTERVAL", 1),
+                   count=int(parts["COUNT"]) if "COUNT" in parts else None,
+                   until=until,
+                   byday=[WEEKDAY_CODES.index(code) for code in parts.get("BYDAY", "").split(",") if code])
+
+    def __str__(self):
+        parts = [f"FREQ={self.freq}"]
+        if self.interval > 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.byday:
+            parts.append("BYDAY=" + ",".join(WEEKDAY_CODES[day] for day in self.byday))
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        if self.until is not None:
+            parts.append("UNTIL=" + time.strftime("%Y%m%dT%H%M%S", time.gmtime(self.until)))
+        return ";".join(parts)
+
+    def candidates(self, dtstart, skip_to=None):
+        time_of_day = dtstart % DAY
+        if self.freq == "DAILY":
+            step = self.interval * DAY
+            ts = dtstart
+            if skip_to is not None and skip_to > dtstart:
+                ts += (skip_to - dtstart) // step * step
+            while True:
+                yield ts
+                ts += step
+
+        elif self.freq == "WEEKLY":
+            days = self.byday or (ts_weekday(dtstart),)
+            step = self.interval * 7 * DAY
+            week = dtstart - time_of_day - ts_weekday(dtstart) * DAY
+            if skip_to is not None and skip_to > week:
+                week += max((skip_to - week) // step - 1, 0) * step
+            while True:
+                for day in days:
+                    ts = week + day * DAY + time_of_day
+                    if ts >= dtstart:
+                        yield ts
+                week += step
+
+        else:
+            year, month, day = ts_date(dtstart)
+            months = self.interval * (12 if self.freq == "YEARLY" else 1)
+            k = 0
+            if skip_to is not None and skip_to > dtstart:
+                skip_year, skip_month, _ = ts_date(skip_to)
+                k = max(((skip_year - year) * 12 + skip_month - month) // months - 1, 0)
+            while True:
+                y, m = add_months(year, month, k * months)
+                if day <= calendar.monthrange(y, m)[1]:
+                    yield to_timestamp(y, m, day) + time_of_day
+                k += 1
+
+    def occurrences(self, dtstart, window_start, window_end):
+        seen = 0
+        skip_to = window_start if self.count is None else None
+        for ts in self.candidates(dtstart, skip_to):
+            if ts >= window_end or (self.until is not None and ts > self.until):
+                return
+            seen += 1
+            if self.count is not None and seen > self.count:
+                return
+            if ts >= window_start:
+                yield ts
+
+    def last_occurrence(self, dtstart):
+        if self.count is None:
+            return self.until
+        last = None
+        for last in self.occurrences(dtstart, dtstart, self.until + 1 if self.until is not None else float("inf")):
+            pass
+        return last
+
+
+def expand_recurrence(recurrence, exceptions, window_start, window_end):
+    rule = RecurrenceRule.parse(recurrence["rule"])
+    overrides = {exception["occurrence_ts"]: exception for exception in exceptions}
+
+    def occurrence(ts, exception=None):
+        event = {"id":            None,
+                 "recurrence_id": recurrence["id"],
+                 "occurrence_ts": ts,
+                 "event_name":    recurrence["event_name"],
+                 "start_ts":      ts,
+                 "end_ts":        ts + recurrence["duration"]}
+        if exception is not None:
+            for column in ("event_name", "start_ts", "end_ts"):
+                if exception[column] is not None:
+                    event[column] = exception[column]
+        return event
+
+    for ts in rule.occurrences(recurrence["start_ts"], window_start, window_end):
+        exception = overrides.get(ts)
+        if exception is None:
+            yield occurrence(ts)
+        elif not exception["cancelled"]:
+            event = occurrence(ts, exception)
+            if window_start <= event["start_ts"] < window_end:
+                yield event
+
+    # Overrides that moved an occurrence into this window from outside it.
+    for ts, exception in overrides.items():
+        if exception["cancelled"] or window_start <= ts < window_end:
+            continue
+        if exception["start_ts"] is not None and window_start <= exception["start_ts"] < window_end:
+            yield occurrence(ts, exception)
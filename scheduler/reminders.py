@@ -0,0 +1,123 @@
+import heapq
+import itertools
+import threading
+from .times import now_ts
+
+
+# Events flushed by the write queue come back later from the remote watcher with an id,
+# so plain events are keyed by what the user sees rather than by id.
+def reminder_key(event):
+    if event.get("recurrence_id") is not None:
+        return "occurrence", event["recurrence_id"], event["occurrence_ts"]
+    return "event", event["event_name"], event["start_ts"]
+
+
+class ReminderDispatcher:
+    def __init__(self, storage, lead=0, horizon=86400, grace=300, max_sleep=60, clock=now_ts):
+        self.storage      = storage
+        self.lead         = lead
+        self.horizon      = horizon
+        self.grace        = grace
+        self.max_sleep    = max_sleep
+        self.clock        = clock
+        self.heap         = []
+        self.keys         = {}
+        self.counter      = itertools.count()
+        self.loaded_until = None
+        self.condition    = threading.Condition()
+        self.stopped      = False
+        self.thread       = None
+        self.on_due       = []
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="reminders", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def schedule(self, event):
+        due = event["start_ts"] - self.lead
+        with self.condition:
+            if self.loaded_until is None or due >= self.loaded_until or due < self.clock() - self.grace:
+                return False
+            key = reminder_key(event)
+            if key in self.keys:
+                return False
+            self.keys[key] = due
+            was_next = not self.heap or due < self.heap[0][0]
+            heapq.heappush(self.heap, (due, next(self.counter), event))
+            if was_next:
+                self.condition.notify()
+        return True
+
+    def on_change(self, events):
+        if events is None:
+            with self.condition:
+                for _, _, event in self.heap:
+                    self.keys.pop(reminder_key(event), None)
+                self.heap, self.loaded_until = [], None
+                self.condition.notify()
+            return
+        for event in events:
+            self.schedule(event)
+
+    def load(self, now):
+        with self.condition:
+            start = self.loaded_until
+        if start is None:
+            self.storage.mark_passed(now - self.grace)
+            start = now - self.grace
+        end = now + self.horizon
+        # The window is in due times; an event is due `lead` seconds before it starts.
+        events = self.storage.upcoming_events(start + self.lead, end + self.lead)
+        with self.condition:
+            self.keys = {key: due for key, due in self.keys.items() if due >= now - self.grace}
+            self.loaded_until = end
+        for event in events:
+            self.schedule(event)
+
+    def pop_due(self, now):
+        due = []
+        with self.condition:
+            while self.heap and self.heap[0][0] <= now:
+                due.append(heapq.heappop(self.heap)[2])
+        return due
+
+    def fire(self, events):
+        for event in events:
+            for callback in self.on_due:
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(e)
+
+    def sleep(self):
+        with self.condition:
+            if self.stopped:
+                return
+            now = self.clock()
+            deadline = min(self.loaded_until if self.loaded_until is not None else now,
+                           self.heap[0][0] if self.heap else now + self.max_sleep)
+            timeout = min(deadline - now, self.max_sleep)
+            if timeout > 0:
+                self.condition.wait(timeout)
+
+    def run(self):
+        while not self.stopped:
+            try:
+                now = self.clock()
+                if self.loaded_until is None or now >= self.loaded_until:
+                    self.load(now)
+                due = self.pop_due(now)
+                if due:
+                    self.fire(due)
+                    self.storage.mark_passed(now)
+            except Exception as e:
+                print(e)
+                with self.condition:
+                    self.condition.wait(self.max_sleep)
+            self.sleep()
@@ -0,0 +1,138 @@
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from .times import now_ts
+
+WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return WORD.findall((text or "").lower())
+
+
+def document_key(event):
+    if event.get("rule") is not None:
+        return "series", event["id"]
+    return "event", event["event_name"], event["start_ts"]
+
+
+class SearchIndex:
+    FIELDS = ("event_name", "description")
+
+    def __init__(self):
+        self.documents = []
+        self.keys      = {}
+        self.postings  = {}
+        self.terms     = []
+        self.ready     = False
+        self.storage   = None
+        self.building  = False
+        self.stale     = False
+        self.pending   = []
+        self.lock      = threading.Lock()
+
+    def load(self, storage):
+        for event in storage.iter_events():
+            self.add(event)
+        for recurrence in storage.recurrences_between(-2 ** 62, 2 ** 62):
+            self.add(recurrence)
+
+    # Builds into a fresh index and swaps it in, so searches keep answering from the old
+    # one meanwhile. A refresh asked for mid-build runs another pass instead of overlapping.
+    def build(self, storage):
+        with self.lock:
+            self.storage = storage
+            if self.building:
+                self.stale = True
+                return len(self.documents)
+            self.building = True
+        try:
+            while True:
+                fresh = SearchIndex()
+                fresh.load(storage)
+                with self.lock:
+                    if self.stale:
+                        self.stale = False
+                        continue
+                    for event in self.pending:
+                        fresh.add(event)
+                    self.documents, self.keys = fresh.documents, fresh.keys
+                    self.postings, self.terms = fresh.postings, fresh.terms
+                    self.pending = []
+                    self.ready   = True
+                    return len(self.documents)
+        finally:
+            with self.lock:
+                self.building = False
+
+    def add(self, event):
+        key = document_key(event)
+        words = [word for field in self.FIELDS for word in tokenize(event.get(field))]
+        with self.lock:
+            if self.building:
+                self.pending.append(event)
+            if key in self.keys:
+                return False
+            doc = len(self.documents)
+            self.keys[key] = doc
+            self.documents.append({"event_name": event["event_name"],
+                                   "start_ts":   event["start_ts"],
+                                   "rule":       event.get("rule")})
+            for word in set(words):
+                postings = self.postings.get(word)
+                if postings is None:
+                    postings = self.postings[word] = set()
+                    insort(self.terms, word)
+                postings.add(doc)
+        return True
+
+    # A full refresh means rows may have been renamed or deleted, which add() can't undo.
+    def on_change(self, events):
+        if events is None:
+            if self.storage is not None:
+                threading.Thread(target=self.refresh, name="search-index", daemon=True).start()
+            return
+        for event in events:
+            if "event_name" in event:
+                self.add(event)
+
+    def refresh(self):
+        try:
+            self.build(self.storage)
+        except Exception as e:
+            print(e)
+
+    def matching(self, token):
+        scores = {}
+        idf = math.log(1 + len(self.documents))
+        position = bisect_left(self.terms, token)
+        while position < len(self.terms) and self.terms[position].startswith(token):
+            term = self.terms[position]
+            postings = self.postings[term]
+            weight = (idf - math.log(1 + len(postings))) + (1.0 if term == token else 0.5)
+            for doc in postings:
+                scores[doc] = max(scores.get(doc, 0.0), weight)
+            position += 1
+        return scores
+
+    def search(self, query, page=0, page_size=20):
+        tokens = tokenize(query)
+        if not tokens:
+            return 0, []
+        with self.lock:
+            scores = None
+            for token in sorted(set(tokens), key=len, reverse=True):
+                matches = self.matching(token)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {doc: score + matches[doc] for doc, score in scores.items() if doc in matches}
+                if not scores:
+                    return 0, []
+            now = now_ts()
+            ranked = heapq.nsmallest((page + 1) * page_size, scores,
+                                     key=lambda doc: (-scores[doc], abs(self.documents[doc]["start_ts"] - now)))
+            results = [dict(self.documents[doc], score=scores[doc]) for doc in ranked[page * page_size:]]
+        return len(scores), results
@@ -0,0 +1,679 @@
+import sqlite3
+import threading
+from datetime import datetime
+from itertools import islice
+from .heatmap import bin_days
+from .pool import ConnectionPool
+from .recurrence import RecurrenceRule, expand_recurrence
+from .times import DAY, event_timestamps, month_range, to_timestamp, with_timestamps, year_range
+
+
+EVENT_COLUMNS = ("event_name", "start_hour", "start_min", "start_ampm", "end_hour", "end_min", "end_ampm",
+                 "month", "day", "year", "start_ts", "end_ts", "date_passed", "date_set")
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+RECURRENCE_COLUMNS = ("event_name", "start_ts", "duration", "rule", "until_ts", "date_set")
+EXCEPTION_COLUMNS  = ("recurrence_id", "occurrence_ts", "cancelled", "event_name", "start_ts", "end_ts")
+
+# Every write to these tables is recorded in `changes` by triggers, so clients can pull
+# deltas by change id no matter which client (or tool) made the write.
+LOGGED_TABLES = ("events", "recurrences", "recurrence_exceptions")
+LOGGED_ACTIONS = (("insert", "NEW"), ("update", "NEW"), ("delete", "OLD"))
+LOG_TRIGGERS   = {f"{table}_log_{action}" for table in LOGGED_TABLES for action, _ in LOGGED_ACTIONS}
+
+
+class Storage:
+    def month_counts(self, year, month):
+        counts = self.event_counts(year, month)
+        start, end = month_range(year, month)
+        for occurrence in self.occurrences(start, end):
+            day = (occurrence["start_ts"] - start) // DAY + 1
+            counts[day] = counts.get(day, 0) + 1
+        return counts
+
+    def year_counts(self, year):
+        start, end = year_range(year)
+        days, counts = self.event_histogram(start, end)
+        occurrences = [(occurrence["start_ts"] - start) // DAY for occurrence in self.occurrences(start, end)]
+        return bin_days(days + occurrences, counts + [1] * len(occurrences), (end - start) // DAY)
+
+    def upcoming_events(self, start_ts, end_ts):
+        events = self.unpassed_events(start_ts, end_ts)
+        return events + list(self.occurrences(start_ts, end_ts))
+
+    def busy_spans(self, start_ts, end_ts):
+        occurrences = self.occurrences(start_ts - DAY, end_ts)
+        return self.event_spans(start_ts, end_ts) + [(row["start_ts"], row["end_ts"]) for row in occurrences]
+
+    def day_events(self, year, month, day):
+        start = to_timestamp(year, month, day)
+        return self.range_events(start, start + DAY)
+
+    def day_count(self, year, month, day):
+        start = to_timestamp(year, month, day)
+        return self.event_count(start, start + DAY) + sum(1 for _ in self.occurrences(start, start + DAY))
+
+    def range_events(self, start_ts, end_ts):
+        events = self.event_range(start_ts, end_ts)
+        occurrences = list(self.occurrences(start_ts, end_ts))
+        if occurrences:
+            events = sorted(events + occurrences, key=lambda event: event["start_ts"])
+        return events
+
+    def occurrences(self, start_ts, end_ts):
+        recurrences = self.recurrences_between(start_ts, end_ts)
+        if not recurrences:
+            return
+        exceptions = {}
+        for exception in self.recurrence_exceptions([recurrence["id"] for recurrence in recurrences]):
+            exceptions.setdefault(exception["recurrence_id"], []).append(exception)
+        for recurrence in recurrences:
+            yield from expand_recurrence(recurrence, exceptions.get(recurrence["id"], ()), start_ts, end_ts)
+
+    @staticmethod
+    def with_until(recurrence):
+        until_ts = RecurrenceRule.parse(recurrence["rule"]).last_occurrence(recurrence["start_ts"])
+        return dict(recurrence, until_ts=until_ts)
+
+    def event_counts(self, year, month):
+        raise NotImplementedError
+
+    def event_histogram(self, start_ts, end_ts):
+        raise NotImplementedError
+
+    def event_range(self, start_ts, end_ts):
+        raise NotImplementedError
+
+    def event_spans(self, start_ts, end_ts):
+        raise NotImplementedError
+
+    def event_page(self, start_ts, end_ts, after=None, limit=200):
+        raise NotImplementedError
+
+    def event_count(self, start_ts, end_ts):
+        raise NotImplementedError
+
+    def changes_after(self, last_id, limit=1000):
+        raise NotImplementedError
+
+    def max_change_id(self):
+        raise NotImplementedError
+
+    def min_change_id(self):
+        raise NotImplementedError
+
+    def has_change_log(self):
+        raise NotImplementedError
+
+    def prune_changes(self, before_ts):
+        raise NotImplementedError
+
+    def events_by_ids(self, ids):
+        raise NotImplementedError
+
+    def unpassed_events(self, start_ts, end_ts):
+        raise NotImplementedError
+
+    def mark_passed(self, until_ts):
+        raise NotImplementedError
+
+    def recurrences_between(self, start_ts, end_ts):
+        raise NotImplementedError
+
+    def recurrence_exceptions(self, recurrence_ids):
+        raise NotImplementedError
+
+    def add_events(self, events, batch_size=1000, progress=None):
+        added = 0
+        for batch in batched(events, batch_size):
+            self.insert_batch([with_timestamps(event) for event in batch])
+            added += len(batch)
+            if progress is not None:
+                progress(added)
+        return added
+
+    def add_event(self, event):
+        raise NotImplementedError
+
+    def insert_batch(self, events):
+        raise NotImplementedError
+
+    def iter_events(self, start_ts=None, end_ts=None):
+        raise NotImplementedError
+
+    def add_recurrence(self, recurrence):
+        raise NotImplementedError
+
+    def add_exception(self, exception):
+        raise NotImplementedError
+
+    def migrate(self, batch_size=1000, progress=None):
+        raise NotImplementedError
+
+
+class MySQLStorage(Storage):
+    def __init__(self, pool):
+        self.pool = pool
+
+    def event_counts(self, year, month):
+        start, end = month_range(year, month)
+        month_events = {}
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    '''SELECT FLOOR((start_ts - %s) / %s) + 1 AS day, COUNT(*) AS num_events FROM `events`
+                       WHERE start_ts >= %s AND start_ts < %s GROUP BY 1''',
+                    (start, DAY, start, end))
+                for row in cursor.fetchall():
+                    month_events[int(row["day"])] = row["num_events"]
+        return month_events
+
+    def event_histogram(self, start_ts, end_ts):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    '''SELECT FLOOR((start_ts - %s) / %s) AS day, COUNT(*) AS num_events FROM `events`
+                       WHERE start_ts >= %s AND start_ts < %s GROUP BY 1''',
+                    (start_ts, DAY, start_ts, end_ts))
+                rows = cursor.fetchall()
+        return [int(row["day"]) for row in rows], [row["num_events"] for row in rows]
+
+    def event_range(self, start_ts, end_ts):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('''SELECT * FROM `events` WHERE start_ts >= %s AND start_ts < %s ORDER BY start_ts, id''',
+                               (start_ts, end_ts))
+                return cursor.fetchall()
+
+    # Events run at most a day, so starting a day early keeps the start_ts index usable.
+    def event_spans(self, start_ts, end_ts):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('''SELECT start_ts, end_ts FROM `events`
+                                  WHERE start_ts >= %s AND start_ts < %s AND end_ts > %s''',
+                               (start_ts - DAY, end_ts, start_ts))
+                return [(row["start_ts"], row["end_ts"]) for row in cursor.fetchall()]
+
+    # Keyset pagination on (start_ts, id): every page is a short range scan of the start_ts
+    # index however deep into the day it starts, where OFFSET would rescan the skipped rows.
+    def event_page(self, start_ts, end_ts, after=None, limit=200):
+        after_ts, after_id = after or (start_ts - 1, 0)
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('''SELECT * FROM `events` WHERE start_ts >= %s AND start_ts < %s
+                                  AND (start_ts > %s OR (start_ts = %s AND id > %s))
+                                  ORDER BY start_ts, id LIMIT %s''',
+                               (start_ts, end_ts, after_ts, after_ts, after_id, limit))
+                return cursor.fetchall()
+
+    def event_count(self, start_ts, end_ts):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('''SELECT COUNT(*) AS num_events FROM `events` WHERE start_ts >= %s AND start_ts < %s''',
+                               (start_ts, end_ts))
+                return cursor.fetchone()["num_events"]
+
+    def changes_after(self, last_id, limit=1000):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('''SELECT * FROM `changes` WHERE id > %s ORDER BY id LIMIT %s''', (last_id, limit))
+                return cursor.fetchall()
+
+    def max_change_id(self):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('''SELECT COALESCE(MAX(id), 0) AS max_id FROM `changes`''')
+                return cursor.fetchone()["max_id"]
+
+    def min_change_id(self):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('''SELECT MIN(id) AS min_id FROM `changes`''')
+                return cursor.fetchone()["min_id"]
+
+    def has_change_log(self):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('''SELECT TRIGGER_NAME FROM information_schema.TRIGGERS
+                                  WHERE TRIGGER_SCHEMA = DATABASE()''')
+                return LOG_TRIGGERS <= {row["TRIGGER_NAME"] for row in cursor.fetchall()}
+
+    def prune_changes(self, before_ts):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                pruned = cursor.execute('''DELETE FROM `changes` WHERE changed_at < %s''', (before_ts,))
+            connection.commit()
+        return pruned
+
+    def events_by_ids(self, ids):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('''SELECT * FROM `events` WHERE id IN %s ORDER BY id''', (tuple(ids),))
+                return cursor.fetchall()
+
+    def unpassed_events(self, start_ts, end_ts):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('''SELECT * FROM `events` WHERE start_ts >= %s AND start_ts < %s AND date_passed = 0''',
+                               (start_ts, end_ts))
+                return list(cursor.fetchall())
+
+    def mark_passed(self, until_ts):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                marked = cursor.execute('''UPDATE `events` SET date_passed = 1 WHERE start_ts <= %s AND date_passed = 0''',
+                                        (until_ts,))
+            connection.commit()
+        return marked
+
+    def add_event(self, event):
+        event = with_timestamps(event)
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f'''INSERT INTO `events` ({", ".join(EVENT_COLUMNS)})
+                               VALUES ({", ".join(["%s"] * len(EVENT_COLUMNS))})''',
+                               tuple(event[column] for column in EVENT_COLUMNS))
+                event_id = cursor.lastrowid
+            connection.commit()
+        return event_id
+
+    def insert_batch(self, events):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.executemany(f'''INSERT INTO `events` ({", ".join(EVENT_COLUMNS)})
+                                   VALUES ({", ".join(["%s"] * len(EVENT_COLUMNS))})''',
+                                   [tuple(event[column] for column in EVENT_COLUMNS) for event in events])
+            connection.commit()
+
+    def iter_events(self, start_ts=None, end_ts=None):
+        from pymysql import cursors
+        with self.pool.connection() as connection:
+            with connection.cursor(cursors.SSDictCursor) as cursor:
+                cursor.execute('''SELECT * FROM `events` WHERE start_ts >= %s AND start_ts < %s ORDER BY start_ts, id''',
+                               (start_ts if start_ts is not None else -2 ** 62, end_ts if end_ts is not None else 2 ** 62))
+                yield from cursor
+
+    def recurrences_between(self, start_ts, end_ts):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('''SELECT * FROM `recurrences` WHERE start_ts < %s AND (until_ts IS NULL OR until_ts >= %s)
+                                  OR id IN (SELECT recurrence_id FROM `recurrence_exceptions`
+                                            WHERE NOT cancelled AND start_ts >= %s AND start_ts < %s)''',
+                               (end_ts, start_ts, start_ts, end_ts))
+                return cursor.fetchall()
+
+    def recurrence_exceptions(self, recurrence_ids):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('''SELECT * FROM `recurrence_exceptions` WHERE recurrence_id IN %s''',
+                               (tuple(recurrence_ids),))
+                return cursor.fetchall()
+
+    def add_recurrence(self, recurrence):
+        recurrence = self.with_until(recurrence)
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f'''INSERT INTO `recurrences` ({", ".join(RECURRENCE_COLUMNS)})
+                               VALUES ({", ".join(["%s"] * len(RECURRENCE_COLUMNS))})''',
+                               tuple(recurrence[column] for column in RECURRENCE_COLUMNS))
+                recurrence_id = cursor.lastrowid
+            connection.commit()
+        return recurrence_id
+
+    def add_exception(self, exception):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f'''REPLACE INTO `recurrence_exceptions` ({", ".join(EXCEPTION_COLUMNS)})
+                               VALUES ({", ".join(["%s"] * len(EXCEPTION_COLUMNS))})''',
+                               tuple(exception.get(column) for column in EXCEPTION_COLUMNS))
+            connection.commit()
+
+    def migrate(self, batch_size=1000, progress=None):
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('''SELECT COLUMN_NAME FROM information_schema.COLUMNS
+                                  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'events' ''')
+                columns = {row["COLUMN_NAME"] for row in cursor.fetchall()}
+                if "start_ts" not in columns:
+                    cursor.execute('''ALTER TABLE `events` ADD COLUMN start_ts BIGINT NULL,
+                                                         ADD COLUMN end_ts BIGINT NULL,
+                                                         ADD INDEX events_start_ts (start_ts)''')
+                cursor.execute('''CREATE TABLE IF NOT EXISTS `recurrences` (
+                                      id         INT AUTO_INCREMENT PRIMARY KEY,
+                                      event_name VARCHAR(255) NOT NULL DEFAULT '',
+                                      start_ts   BIGINT NOT NULL,
+                                      duration   INT NOT NULL DEFAULT 0,
+                                      rule       VARCHAR(255) NOT NULL,
+                                      until_ts   BIGINT NULL,
+                                      date_set   DATETIME NULL,
+                                      INDEX recurrences_start_ts (start_ts)
+                                  )''')
+                cursor.execute('''CREATE TABLE IF NOT EXISTS `recurrence_exceptions` (
+                                      id            INT AUTO_INCREMENT PRIMARY KEY,
+                                      recurrence_id INT NOT NULL,
+                                      occurrence_ts BIGINT NOT NULL,
+                                      cancelled     BOOLEAN NOT NULL DEFAULT FALSE,
+                                      event_name    VARCHAR(255) NULL,
+                                      start_ts      BIGINT NULL,
+                                      end_ts        BIGINT NULL,
+                                      UNIQUE KEY recurrence_occurrence (recurrence_id, occurrence_ts),
+                                      INDEX recurrence_exceptions_start_ts (start_ts)
+                                  )''')
+                cursor.execute('''CREATE TABLE IF NOT EXISTS `changes` (
+                                      id         BIGINT AUTO_INCREMENT PRIMARY KEY,
+                                      table_name VARCHAR(64) NOT NULL,
+                                      row_id     INT NOT NULL,
+                                      action     VARCHAR(8) NOT NULL,
+                                      changed_at BIGINT NOT NULL,
+                                      INDEX changes_changed_at (changed_at)
+                                  )''')
+                cursor.execute('''SELECT TRIGGER_NAME FROM information_schema.TRIGGERS
+                                  WHERE TRIGGER_SCHEMA = DATABASE()''')
+                existing = {row["TRIGGER_NAME"] for row in cursor.fetchall()}
+                for name, statement in self.triggers():
+                    if name not in existing:
+                        cursor.execute(statement)
+            connection.commit()
+
+        last_id, migrated = 0, 0
+        while True:
+            with self.pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute('''SELECT * FROM `events` WHERE id > %s AND start_ts IS NULL ORDER BY id LIMIT %s''',
+                                   (last_id, batch_size))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        return migrated
+                    cursor.executemany('''UPDATE `events` SET start_ts=%s, end_ts=%s WHERE id=%s''',
+                                       [(*event_timestamps(row), row["id"]) for row in rows])
+                connection.commit()
+            last_id = rows[-1]["id"]
+            migrated += len(rows)
+            if progress is not None:
+                progress(migrated)
+
+    @staticmethod
+    def triggers():
+        for table in LOGGED_TABLES:
+            for action, row in LOGGED_ACTIONS:
+                condition = ""
+                if table == "events" and action == "update":
+                    # Backfilling start_ts and flipping date_passed are not changes other clients need to see.
+                    condition = '''WHERE OLD.start_ts IS NOT NULL AND NOT (OLD.event_name <=> NEW.event_name
+                                   AND OLD.start_ts <=> NEW.start_ts AND OLD.end_ts <=> NEW.end_ts)'''
+                yield f"{table}_log_{action}", f'''CREATE TRIGGER `{table}_log_{action}` AFTER {action.upper()} ON `{table}`
+                    FOR EACH ROW INSERT INTO `changes` (table_name, row_id, action, changed_at)
+                    SELECT '{table}', {row}.id, '{action}', UNIX_TIMESTAMP() FROM DUAL {condition}'''
+
+
+class SQLiteStorage(Storage):
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS events (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_name  TEXT NOT NULL DEFAULT '',
+            start_hour  TEXT,
+            start_min   TEXT,
+            start_ampm  TEXT,
+            end_hour    TEXT,
+            end_min     TEXT,
+            end_ampm    TEXT,
+            month       INTEGER NOT NULL,
+            day         INTEGER NOT NULL,
+            year        INTEGER NOT NULL,
+            start_ts    INTEGER,
+            end_ts      INTEGER,
+            date_passed INTEGER NOT NULL DEFAULT 0,
+            date_set    TEXT
+        );
+        CREATE INDEX IF NOT EXISTS events_year_month_day ON events (year, month, day);
+        CREATE TABLE IF NOT EXISTS recurrences (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_name  TEXT NOT NULL DEFAULT '',
+            start_ts    INTEGER NOT NULL,
+            duration    INTEGER NOT NULL DEFAULT 0,
+            rule        TEXT NOT NULL,
+            until_ts    INTEGER,
+            date_set    TEXT
+        );
+        CREATE INDEX IF NOT EXISTS recurrences_start_ts ON recurrences (start_ts);
+        CREATE TABLE IF NOT EXISTS recurrence_exceptions (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            recurrence_id INTEGER NOT NULL,
+            occurrence_ts INTEGER NOT NULL,
+            cancelled     INTEGER NOT NULL DEFAULT 0,
+            event_name    TEXT,
+            start_ts      INTEGER,
+            end_ts        INTEGER,
+            UNIQUE (recurrence_id, occurrence_ts)
+        );
+        CREATE INDEX IF NOT EXISTS recurrence_exceptions_start_ts ON recurrence_exceptions (start_ts);
+        CREATE TABLE IF NOT EXISTS changes (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id     INTEGER NOT NULL,
+            action     TEXT NOT NULL,
+            changed_at INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS changes_changed_at ON changes (changed_at);
+    '''
+    INDEXES = '''
+        CREATE INDEX IF NOT EXISTS events_start_ts ON events (start_ts);
+    '''
+
+    def __init__(self, path):
+        self.path   = path
+        self.local  = threading.local()
+        self.lock   = threading.Lock()
+        self.ready  = False
+
+    def connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            with self.lock:
+                if not self.ready:
+                    self.prepare(connection)
+                    self.ready = True
+            self.local.connection = connection
+        return connection
+
+    def prepare(self, connection):
+        connection.executescript(self.SCHEMA)
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(events)")}
+        if "start_ts" not in columns:
+            connection.execute("ALTER TABLE events ADD COLUMN start_ts INTEGER")
+            connection.execute("ALTER TABLE events ADD COLUMN end_ts INTEGER")
+        connection.executescript(self.INDEXES)
+        connection.executescript(self.triggers())
+
+    @staticmethod
+    def adapt(value):
+        return value.isoformat(" ") if isinstance(value, datetime) else value
+
+    def event_counts(self, year, month):
+        start, end = month_range(year, month)
+        rows = self.connection().execute(
+            '''SELECT (start_ts - ?) / ? + 1, COUNT(*) FROM events WHERE start_ts >= ? AND start_ts < ? GROUP BY 1''',
+            (start, DAY, start, end))
+        return {day: num_events for day, num_events in rows}
+
+    def event_histogram(self, start_ts, end_ts):
+        rows = self.connection().execute(
+            '''SELECT (start_ts - ?) / ?, COUNT(*) FROM events WHERE start_ts >= ? AND start_ts < ? GROUP BY 1''',
+            (start_ts, DAY, start_ts, end_ts)).fetchall()
+        return [day for day, _ in rows], [num_events for _, num_events in rows]
+
+    def event_range(self, start_ts, end_ts):
+        rows = self.connection().execute(
+            '''SELECT * FROM events WHERE start_ts >= ? AND start_ts < ? ORDER BY start_ts, id''', (start_ts, end_ts))
+        return [dict(row) for row in rows]
+
+    def event_spans(self, start_ts, end_ts):
+        return self.connection().execute(
+            '''SELECT start_ts, end_ts FROM events WHERE start_ts >= ? AND start_ts < ? AND end_ts > ?''',
+            (start_ts - DAY, end_ts, start_ts)).fetchall()
+
+    def event_page(self, start_ts, end_ts, after=None, limit=200):
+        after_ts, after_id = after or (start_ts - 1, 0)
+        rows = self.connection().execute(
+            '''SELECT * FROM events WHERE start_ts >= ? AND start_ts < ? AND (start_ts > ? OR (start_ts = ? AND id > ?))
+               ORDER BY start_ts, id LIMIT ?''', (start_ts, end_ts, after_ts, after_ts, after_id, limit))
+        return [dict(row) for row in rows]
+
+    def event_count(self, start_ts, end_ts):
+        return self.connection().execute(
+            '''SELECT COUNT(*) FROM events WHERE start_ts >= ? AND start_ts < ?''', (start_ts, end_ts)).fetchone()[0]
+
+    @staticmethod
+    def triggers():
+        statements = []
+        for table in LOGGED_TABLES:
+            for action, row in LOGGED_ACTIONS:
+                condition = ""
+                if table == "events" and action == "update":
+                    condition = '''WHEN OLD.start_ts IS NOT NULL AND (OLD.event_name IS NOT NEW.event_name
+                                   OR OLD.start_ts IS NOT NEW.start_ts OR OLD.end_ts IS NOT NEW.end_ts)'''
+                statements.append(f'''CREATE TRIGGER IF NOT EXISTS {table}_log_{action} AFTER {action.upper()} ON {table} {condition}
+                    BEGIN
+                        INSERT INTO changes (table_name, row_id, action, changed_at)
+                        VALUES ('{table}', {row}.id, '{action}', CAST(strftime('%s', 'now') AS INTEGER));
+                    END;''')
+        return "\n".join(statements)
+
+    def changes_after(self, last_id, limit=1000):
+        rows = self.connection().execute('''SELECT * FROM changes WHERE id > ? ORDER BY id LIMIT ?''', (last_id, limit))
+        return [dict(row) for row in rows]
+
+    def max_change_id(self):
+        return self.connection().execute('''SELECT COALESCE(MAX(id), 0) FROM changes''').fetchone()[0]
+
+    def min_change_id(self):
+        return self.connection().execute('''SELECT MIN(id) FROM changes''').fetchone()[0]
+
+    def has_change_log(self):
+        rows = self.connection().execute('''SELECT name FROM sqlite_master WHERE type = 'trigger' ''')
+        return LOG_TRIGGERS <= {row[0] for row in rows}
+
+    def prune_changes(self, before_ts):
+        connection = self.connection()
+        with connection:
+            cursor = connection.execute('''DELETE FROM changes WHERE changed_at < ?''', (before_ts,))
+        return cursor.rowcount
+
+    def events_by_ids(self, ids):
+        rows = self.connection().execute(
+            f'''SELECT * FROM events WHERE id IN ({", ".join("?" * len(ids))}) ORDER BY id''', tuple(ids))
+        return [dict(row) for row in rows]
+
+    def unpassed_events(self, start_ts, end_ts):
+        rows = self.connection().execute(
+            '''SELECT * FROM events WHERE start_ts >= ? AND start_ts < ? AND date_passed = 0''', (start_ts, end_ts))
+        return [dict(row) for row in rows]
+
+    def mark_passed(self, until_ts):
+        connection = self.connection()
+        with connection:
+            cursor = connection.execute(
+                '''UPDATE events SET date_passed = 1 WHERE start_ts <= ? AND date_passed = 0''', (until_ts,))
+        return cursor.rowcount
+
+    def add_event(self, event):
+        event = with_timestamps(event)
+        connection = self.connection()
+        with connection:
+            cursor = connection.execute(
+                f'''INSERT INTO events ({", ".join(EVENT_COLUMNS)}) VALUES ({", ".join("?" * len(EVENT_COLUMNS))})''',
+                tuple(self.adapt(event[column]) for column in EVENT_COLUMNS))
+        return cursor.lastrowid
+
+    def insert_batch(self, events):
+        connection = self.connection()
+        with connection:
+            connection.executemany(
+                f'''INSERT INTO events ({", ".join(EVENT_COLUMNS)}) VALUES ({", ".join("?" * len(EVENT_COLUMNS))})''',
+                [tuple(self.adapt(event[column]) for column in EVENT_COLUMNS) for event in events])
+
+    def iter_events(self, start_ts=None, end_ts=None):
+        rows = self.connection().execute(
+            '''SELECT * FROM events WHERE start_ts >= ? AND start_ts < ? ORDER BY start_ts, id''',
+            (start_ts if start_ts is not None else -2 ** 62, end_ts if end_ts is not None else 2 ** 62))
+        for row in rows:
+            yield dict(row)
+
+    def recurrences_between(self, start_ts, end_ts):
+        rows = self.connection().execute(
+            '''SELECT * FROM recurrences WHERE start_ts < ? AND (until_ts IS NULL OR until_ts >= ?)
+                  OR id IN (SELECT recurrence_id FROM recurrence_exceptions
+                            WHERE NOT cancelled AND start_ts >= ? AND start_ts < ?)''',
+            (end_ts, start_ts, start_ts, end_ts))
+        return [dict(row) for row in rows]
+
+    def recurrence_exceptions(self, recurrence_ids):
+        rows = self.connection().execute(
+            f'''SELECT * FROM recurrence_exceptions WHERE recurrence_id IN ({", ".join("?" * len(recurrence_ids))})''',
+            tuple(recurrence_ids))
+        return [dict(row) for row in rows]
+
+    def add_recurrence(self, recurrence):
+        recurrence = self.with_until(recurrence)
+        connection = self.connection()
+        with connection:
+            cursor = connection.execute(
+                f'''INSERT INTO recurrences ({", ".join(RECURRENCE_COLUMNS)}) VALUES ({", ".join("?" * len(RECURRENCE_COLUMNS))})''',
+                tuple(self.adapt(recurrence[column]) for column in RECURRENCE_COLUMNS))
+        return cursor.lastrowid
+
+    def add_exception(self, exception):
+        connection = self.connection()
+        with connection:
+            connection.execute(
+                f'''INSERT OR REPLACE INTO recurrence_exceptions ({", ".join(EXCEPTION_COLUMNS)})
+                   VALUES ({", ".join("?" * len(EXCEPTION_COLUMNS))})''',
+                tuple(exception.get(column) for column in EXCEPTION_COLUMNS))
+
+    def migrate(self, batch_size=1000, progress=None):
+        connection = self.connection()
+        last_id, migrated = 0, 0
+        while True:
+            rows = connection.execute(
+                '''SELECT * FROM events WHERE id > ? AND start_ts IS NULL ORDER BY id LIMIT ?''',
+                (last_id, batch_size)).fetchall()
+            if not rows:
+                return migrated
+            with connection:
+                connection.executemany('''UPDATE events SET start_ts=?, end_ts=? WHERE id=?''',
+                                       [(*event_timestamps(row), row["id"]) for row in rows])
+            last_id = rows[-1]["id"]
+            migrated += len(rows)
+            if progress is not None:
+                progress(migrated)
+
+
+def open_storage(config):
+    if (config.get("STORAGE") or "mysql").lower() == "sqlite":
+        return SQLiteStorage(config.get("SQLITE_PATH") or "scheduler.db")
+    from pymysql import cursors
+    return MySQLStorage(ConnectionPool(size=int(config.get("MYSQL_POOL_SIZE") or 5),
+                                       timeout=float(config.get("MYSQL_POOL_TIMEOUT") or 10),
+                                       ping_interval=float(config.get("MYSQL_POOL_PING_INTERVAL") or 30),
+                                       recycle=float(config.get("MYSQL_POOL_RECYCLE") or 3600),
+                                       host=config.get("MYSQL_HOST"),
+                                       user=config.get("MYSQL_USER"),
+                                       password=config.get("MYSQL_PASS"),
+                                       db=config.get("MYSQL_DB"),
+                                       charset='utf8mb4',
+                                       # Pooled connections are reused, so a read must not keep
+                                       # a REPEATABLE READ snapshot open between borrows.
+                                       autocommit=True,
+                                       cursorclass=cursors.DictCursor))
@@ -0,0 +1,91 @@
+import calendar
+import time
+from datetime import datetime
+
+
+DAY = 86400
+
+
+# Event times are wall-clock times, stored as epoch seconds as if the wall clock were UTC.
+def to_timestamp(year, month, day, hour=0, minute=0):
+    return calendar.timegm((year, month, day, hour, minute, 0))
+
+
+def month_range(year, month):
+    start = to_timestamp(year, month, 1)
+    return start, start + calendar.monthrange(year, month)[1] * DAY
+
+
+def now_ts():
+    return calendar.timegm(time.localtime())
+
+
+def year_range(year):
+    return to_timestamp(year, 1, 1), to_timestamp(year + 1, 1, 1)
+
+
+def parse_time(hour, minute, ampm):
+    try:
+        hour, minute = int(hour), int(minute)
+    except (TypeError, ValueError):
+        return 0, 0
+    hour %= 12
+    if ampm == "PM":
+        hour += 12
+    return hour, minute
+
+
+def event_timestamps(event):
+    day_start = to_timestamp(int(event["year"]), int(event["month"]), int(event["day"]))
+    start_hour, start_min = parse_time(event["start_hour"], event["start_min"], event["start_ampm"])
+    start_ts = day_start + start_hour * 3600 + start_min * 60
+    if not event["end_hour"]:
+        return start_ts, start_ts
+    end_hour, end_min = parse_time(event["end_hour"], event["end_min"], event["end_ampm"])
+    end_ts = day_start + end_hour * 3600 + end_min * 60
+    if end_ts < start_ts:
+        end_ts += DAY
+    return start_ts, end_ts
+
+
+def with_timestamps(event):
+    if event.get("start_ts") is None:
+        start_ts, end_ts = event_timestamps(event)
+        event = dict(event, start_ts=start_ts, end_ts=end_ts)
+    return event
+
+
+def event_from_timestamps(event_name, start_ts, end_ts):
+    (year, month, day, start_hour, start_min), (end_hour, end_min) = time.gmtime(start_ts)[:5], time.gmtime(end_ts)[3:5]
+    return {"event_name":  event_name,
+            "start_hour":  f"{start_hour % 12 or 12:02d}",
+            "start_min":   f"{start_min:02d}",
+            "start_ampm":  "AM" if start_hour < 12 else "PM",
+            "end_hour":    f"{end_hour % 12 or 12:02d}",
+            "end_min":     f"{end_min:02d}",
+            "end_ampm":    "AM" if end_hour < 12 else "PM",
+            "month":       month,
+            "day":         day,
+            "year":        year,
+            "start_ts":    start_ts,
+            "end_ts":      end_ts,
+            "date_passed": False,
+            "date_set":    datetime.utcnow()}
+
+
+def format_time(ts):
+    hour, minute = ts % DAY // 3600, ts % 3600 // 60
+    return f"{hour % 12 or 12}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+
+def ts_weekday(ts):
+    return (ts // DAY + 3) % 7
+
+
+def ts_date(ts):
+    return time.gmtime(ts)[:3]
+
+
+def add_months(year, month, months):
+    month += months - 1
+    return year + month // 12, month % 12 + 1
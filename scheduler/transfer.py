@@ -0,0 +1,324 @@
+import calendar
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+from itertools import chain
+from .recurrence import RecurrenceRule
+from .times import DAY, event_from_timestamps
+
+FORMATS = ("ics", "csv", "json")
+
+
+def parse_datetime(text):
+    return calendar.timegm(datetime.fromisoformat(text.strip()).timetuple())
+
+
+def format_datetime(ts):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ts))
+
+
+# Series travel as the recurrences row plus an "exceptions" list, both ways.
+def series_from_timestamps(event_name, start_ts, end_ts, rule, exceptions=()):
+    try:
+        rule = str(RecurrenceRule.parse(rule))
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"Cannot import the recurring event {event_name!r} with rule {rule!r}: {e}")
+    return {"event_name": event_name,
+            "start_ts":   start_ts,
+            "duration":   end_ts - start_ts,
+            "rule":       rule,
+            "date_set":   datetime.utcnow(),
+            "exceptions": list(exceptions)}
+
+
+def cancelled(occurrence_ts):
+    return {"occurrence_ts": occurrence_ts, "cancelled": 1, "event_name": None, "start_ts": None, "end_ts": None}
+
+
+# A non-cancelled exception as the occurrence it produces.
+def override_event(series, exception):
+    start_ts = exception["start_ts"] if exception["start_ts"] is not None else exception["occurrence_ts"]
+    return {"event_name": exception["event_name"] or series["event_name"],
+            "start_ts":   start_ts,
+            "end_ts":     exception["end_ts"] if exception["end_ts"] is not None else start_ts + series["duration"]}
+
+
+def iter_series(storage, start_ts=None, end_ts=None):
+    recurrences = storage.recurrences_between(-2 ** 62 if start_ts is None else start_ts,
+                                              2 ** 62 if end_ts is None else end_ts)
+    exceptions = {}
+    if recurrences:
+        for exception in storage.recurrence_exceptions([recurrence["id"] for recurrence in recurrences]):
+            exceptions.setdefault(exception["recurrence_id"], []).append(exception)
+    for recurrence in recurrences:
+        yield dict(recurrence, exceptions=exceptions.get(recurrence["id"], []))
+
+
+def read_record(record, exdates):
+    start_ts = parse_datetime(record["start"])
+    end_ts = parse_datetime(record["end"]) if record.get("end") else start_ts
+    if record.get("rule"):
+        return series_from_timestamps(record["event_name"], start_ts, end_ts, record["rule"],
+                                      [cancelled(parse_datetime(text)) for text in exdates])
+    return event_from_timestamps(record["event_name"], start_ts, end_ts)
+
+
+# CSV and JSON have no way to tie a moved occurrence to its series, so the series skips
+# it and the occurrence is written as a plain event after the series.
+def flattened(events):
+    for event in events:
+        if event.get("rule") is None:
+            yield event, None
+            continue
+        yield event, [format_datetime(exception["occurrence_ts"]) for exception in event["exceptions"]]
+        for exception in event["exceptions"]:
+            if not exception["cancelled"]:
+                yield override_event(event, exception), None
+
+
+def end_of(event):
+    return event["end_ts"] if event.get("rule") is None else event["start_ts"] + event["duration"]
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        yield read_record(row, (row.get("exdates") or "").split())
+
+
+def write_csv(events, stream):
+    writer = csv.writer(stream)
+    writer.writerow(["event_name", "start", "end", "rule", "exdates"])
+    for event, exdates in flattened(events):
+        writer.writerow([event["event_name"], format_datetime(event["start_ts"]), format_datetime(end_of(event)),
+                         event.get("rule") or "", " ".join(exdates or ())])
+        yield event
+
+
+def iter_json(stream, chunk_size=65536):
+    decoder = json.JSONDecoder()
+    buffer = stream.read(chunk_size).lstrip()
+    in_array = buffer.startswith("[")
+    if in_array:
+        buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if in_array and buffer.startswith("]"):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                if buffer:
+                    raise
+                return
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def read_json(stream):
+    for item in iter_json(stream):
+        yield read_record(item, item.get("exdates") or ())
+
+
+def write_json(events, stream):
+    stream.write("[")
+    separator = "\n"
+    for event, exdates in flattened(events):
+        item = {"event_name": event["event_name"],
+                "start":      format_datetime(event["start_ts"]),
+                "end":        format_datetime(end_of(event))}
+        if event.get("rule") is not None:
+            item.update(rule=event["rule"], exdates=exdates)
+        stream.write(separator)
+        stream.write(json.dumps(item))
+        separator = ",\n"
+        yield event
+    stream.write("\n]\n")
+
+
+def unfold_ics(stream):
+    line = None
+    for raw in stream:
+        raw = raw.rstrip("\r\n")
+        if raw[:1] in (" ", "\t") and line is not None:
+            line += raw[1:]
+            continue
+        if line is not None:
+            yield line
+        line = raw
+    if line is not None:
+        yield line
+
+
+def parse_ics_datetime(value):
+    value = value.rstrip("Z")
+    if "T" not in value:
+        return calendar.timegm(time.strptime(value, "%Y%m%d")), True
+    return calendar.timegm(time.strptime(value[:15], "%Y%m%dT%H%M%S")), False
+
+
+def unescape_ics(value):
+    return (value.replace("\\n", "\n").replace("\\N", "\n")
+                 .replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\"))
+
+
+def escape_ics(value):
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+# Plain events stream through; series and their RECURRENCE-ID overrides are held until
+# the end, since an override may come before the series it belongs to.
+def read_ics(stream):
+    properties = None
+    series, overrides = {}, []
+    for line in unfold_ics(stream):
+        name, _, value = line.partition(":")
+        name = name.split(";", 1)[0].upper()
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            properties = {}
+        elif name == "END" and value.upper() == "VEVENT" and properties is not None:
+            if "DTSTART" in properties:
+                start_ts, all_day = parse_ics_datetime(properties["DTSTART"])
+                if "DTEND" in properties:
+                    end_ts = parse_ics_datetime(properties["DTEND"])[0]
+                else:
+                    end_ts = start_ts + DAY if all_day else start_ts
+                event_name = unescape_ics(properties.get("SUMMARY", ""))
+                if "RRULE" in properties:
+                    exdates = [cancelled(parse_ics_datetime(text)[0]) for text in properties.get("EXDATE", ())]
+                    series[properties.get("UID", len(series))] = series_from_timestamps(
+                        event_name, start_ts, end_ts, properties["RRULE"], exdates)
+                elif "RECURRENCE-ID" in properties:
+                    overrides.append((properties.get("UID"), parse_ics_datetime(properties["RECURRENCE-ID"])[0],
+                                      event_from_timestamps(event_name, start_ts, end_ts)))
+                else:
+                    yield event_from_timestamps(event_name, start_ts, end_ts)
+            properties = None
+        elif name == "EXDATE" and properties is not None:
+            properties.setdefault(name, []).extend(value.split(","))
+        elif properties is not None:
+            properties.setdefault(name, value)
+    for uid, occurrence_ts, event in overrides:
+        if uid not in series:
+            yield event
+            continue
+        series[uid]["exceptions"].append({"occurrence_ts": occurrence_ts, "cancelled": 0, "event_name": event["event_name"],
+                                          "start_ts": event["start_ts"], "end_ts": event["end_ts"]})
+    yield from series.values()
+
+
+def fold_ics(line):
+    while len(line) > 75:
+        yield line[:75]
+        line = " " + line[75:]
+    yield line
+
+
+def ics_datetime(ts):
+    return time.strftime("%Y%m%dT%H%M%S", time.gmtime(ts))
+
+
+def vevent(uid, stamp, event, extra=()):
+    return ["BEGIN:VEVENT",
+            f"UID:{uid}@python_event_scheduler",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{ics_datetime(event['start_ts'])}",
+            f"DTEND:{ics_datetime(end_of(event))}",
+            f"SUMMARY:{escape_ics(event['event_name'])}",
+            *extra,
+            "END:VEVENT"]
+
+
+def write_ics(events, stream):
+    stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    stream.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//python_event_scheduler//EN\r\n")
+    for event in events:
+        if event.get("rule") is None:
+            lines = vevent(event["id"], stamp, event)
+        else:
+            uid = f"series-{event['id']}"
+            exceptions = event["exceptions"]
+            lines = vevent(uid, stamp, event, [f"RRULE:{event['rule']}"] +
+                           [f"EXDATE:{ics_datetime(exception['occurrence_ts'])}"
+                            for exception in exceptions if exception["cancelled"]])
+            for exception in exceptions:
+                if not exception["cancelled"]:
+                    lines += vevent(uid, stamp, override_event(event, exception),
+                                    [f"RECURRENCE-ID:{ics_datetime(exception['occurrence_ts'])}"])
+        for line in lines:
+            for folded in fold_ics(line):
+                stream.write(folded + "\r\n")
+        yield event
+    stream.write("END:VCALENDAR\r\n")
+
+
+READERS = {"ics": read_ics, "csv": read_csv, "json": read_json}
+WRITERS = {"ics": write_ics, "csv": write_csv, "json": write_json}
+
+
+def guess_format(path, fmt):
+    if fmt is not None:
+        return fmt
+    extension = path.rsplit(".", 1)[-1].lower()
+    if extension not in FORMATS:
+        raise SystemExit(f"Cannot tell the format of {path}, pass --format")
+    return extension
+
+
+def report(action):
+    def progress(count):
+        print(f"\r{count} events {action}", end="", file=sys.stderr, flush=True)
+    return progress
+
+
+def add_series(storage, series):
+    recurrence_id = storage.add_recurrence({column: series[column]
+                                            for column in ("event_name", "start_ts", "duration", "rule", "date_set")})
+    for exception in series["exceptions"]:
+        storage.add_exception(dict(exception, recurrence_id=recurrence_id))
+
+
+# Plain events are batched as they stream in; recurring series are set aside and added
+# once the events are written.
+def import_events(storage, path, fmt=None, batch_size=1000):
+    reader = READERS[guess_format(path, fmt)]
+    stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    series = []
+
+    def plain(events):
+        for event in events:
+            if event.get("rule") is None:
+                yield event
+            else:
+                series.append(event)
+
+    try:
+        imported = storage.add_events(plain(reader(stream)), batch_size, progress=report("imported"))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    for recurrence in series:
+        add_series(storage, recurrence)
+    return imported + len(series)
+
+
+def export_events(storage, path, fmt=None, start_ts=None, end_ts=None, report_every=1000):
+    writer = WRITERS[guess_format(path, fmt)]
+    stream = sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+    progress = report("exported")
+    exported = 0
+    try:
+        events = chain(storage.iter_events(start_ts, end_ts), iter_series(storage, start_ts, end_ts))
+        for exported, _ in enumerate(writer(events, stream), 1):
+            if exported % report_every == 0:
+                progress(exported)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    progress(exported)
+    return exported
@@ -0,0 +1,85 @@
+import queue
+import threading
+import time
+from .times import with_timestamps
+
+
+class WriteBehindQueue:
+    def __init__(self, storage, batch_size=100, linger=0.2, max_attempts=5, backoff=0.5, max_backoff=30):
+        self.storage      = storage
+        self.batch_size   = batch_size
+        self.linger       = linger
+        self.max_attempts = max_attempts
+        self.backoff      = backoff
+        self.max_backoff  = max_backoff
+        self.queue        = queue.Queue()
+        self.pending      = []
+        self.lock         = threading.Lock()
+        self.thread       = None
+        self.on_queued    = []
+        self.on_flushed   = []
+        self.on_failed    = []
+
+    def submit(self, event):
+        event = with_timestamps(event)
+        with self.lock:
+            self.pending.append(event)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="write-behind", daemon=True)
+                self.thread.start()
+        self.queue.put(event)
+        for callback in self.on_queued:
+            callback(event)
+        return event
+
+    def pending_between(self, start_ts, end_ts):
+        with self.lock:
+            return [event for event in self.pending if start_ts <= event["start_ts"] < end_ts]
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                self.flush(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def flush(self, batch):
+        attempt = 0
+        while True:
+            try:
+                self.storage.add_events(batch, len(batch))
+                break
+            except Exception as e:
+                attempt += 1
+                will_retry = attempt < self.max_attempts
+                if not will_retry:
+                    self.forget(batch)
+                for callback in self.on_failed:
+                    callback(batch, e, will_retry)
+                if not will_retry:
+                    return
+                time.sleep(min(self.backoff * 2 ** (attempt - 1), self.max_backoff))
+        self.forget(batch)
+        for callback in self.on_flushed:
+            callback(batch)
+
+    def forget(self, batch):
+        done = {id(event) for event in batch}
+        with self.lock:
+            self.pending = [event for event in self.pending if id(event) not in done]
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
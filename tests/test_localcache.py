@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+from scheduler.changes import ChangeFeed
+from scheduler.localcache import LocalCache, MirrorWatcher
+from scheduler.storage import SQLiteStorage
+from scheduler.times import to_timestamp
+
+
+# A SQLite stand-in for the server whose add_recurrence fails once on request.
+class FlakyServer(SQLiteStorage):
+    def __init__(self, path):
+        super().__init__(path)
+        self.fail_on = None
+        self.calls   = 0
+
+    def add_recurrence(self, recurrence):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise ConnectionError("server went away")
+        return super().add_recurrence(recurrence)
+
+
+class MirrorPushTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.server    = FlakyServer(os.path.join(self.directory.name, "server.db"))
+        self.local     = LocalCache(os.path.join(self.directory.name, "local.db"))
+        self.watcher   = MirrorWatcher(self.server, self.local, ChangeFeed(), interval=0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def series(self, name):
+        return {"event_name": name, "start_ts": to_timestamp(2021, 3, 1, 9), "duration": 3600,
+                "rule": "FREQ=WEEKLY;COUNT=3", "date_set": None}
+
+    def server_series(self):
+        return sorted(row["event_name"] for row in self.server.recurrences_between(-2 ** 62, 2 ** 62))
+
+    def test_failed_push_does_not_resend_earlier_series(self):
+        self.local.add_recurrence(self.series("A"))
+        self.local.add_recurrence(self.series("B"))
+        self.server.fail_on = 2
+        with self.assertRaises(ConnectionError):
+            self.watcher.push()
+        self.watcher.push()
+        self.assertEqual(self.server_series(), ["A", "B"])
+
+    def test_pull_settles_pushed_series_once(self):
+        self.local.add_recurrence(self.series("A"))
+        self.watcher.poll()
+        self.watcher.poll()
+        self.assertEqual(self.server_series(), ["A"])
+        self.assertEqual([row["event_name"] for row in self.local.recurrences_between(-2 ** 62, 2 ** 62)], ["A"])
+        self.assertEqual(self.local.outbox_size(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
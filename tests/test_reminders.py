@@ -0,0 +1,30 @@
+import unittest
+from scheduler.reminders import ReminderDispatcher
+
+
+class FakeStorage:
+    def __init__(self, events):
+        self.events = events
+
+    def mark_passed(self, until_ts):
+        return 0
+
+    def upcoming_events(self, start_ts, end_ts):
+        return [event for event in self.events if start_ts <= event["start_ts"] < end_ts]
+
+
+class ReminderWindowTest(unittest.TestCase):
+    def test_event_just_past_the_horizon_fires_with_a_long_lead(self):
+        now = [0]
+        event = {"event_name": "standup", "start_ts": 86400 + 600}
+        dispatcher = ReminderDispatcher(FakeStorage([event]), lead=3600, horizon=86400, clock=lambda: now[0])
+        fired = []
+        for now[0] in range(0, 2 * 86400, 60):
+            if dispatcher.loaded_until is None or now[0] >= dispatcher.loaded_until:
+                dispatcher.load(now[0])
+            fired += dispatcher.pop_due(now[0])
+        self.assertEqual(fired, [event])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import argparse
+import sys
+from scheduler.config import load_config
+from scheduler.storage import open_storage
+from scheduler.transfer import FORMATS, export_events, import_events, parse_datetime
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stream events in or out of the scheduler database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="load events from an ICS, CSV or JSON file")
+    importer.add_argument("path", help="file to read, or - for stdin")
+    importer.add_argument("--format", choices=FORMATS)
+    importer.add_argument("--batch-size", type=int, default=1000, help="rows written per transaction")
+
+    exporter = commands.add_parser("export", help="write events to an ICS, CSV or JSON file")
+    exporter.add_argument("path", help="file to write, or - for stdout")
+    exporter.add_argument("--format", choices=FORMATS)
+    exporter.add_argument("--start", help="only events starting at or after this ISO date/time")
+    exporter.add_argument("--end", help="only events starting before this ISO date/time")
+
+    args = parser.parse_args()
+    storage = open_storage(load_config())
+    if args.command == "import":
+        count = import_events(storage, args.path, args.format, args.batch_size)
+        print(f"\nDone, {count} events imported", file=sys.stderr)
+    else:
+        count = export_events(storage, args.path, args.format,
+                              parse_datetime(args.start) if args.start else None,
+                              parse_datetime(args.end) if args.end else None)
+        print(f"\nDone, {count} events exported", file=sys.stderr)